@@ -7,14 +7,17 @@ from utils import process_agendor_report, format_phone_for_whatsapp_business, ge
 from streamlit_option_menu import option_menu
 import pandas as pd
 import os
-from datetime import datetime, date, timedelta
+from datetime import datetime, date
 import io
 import zipfile
 from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
 import warnings
 import numpy as np
 import glob
-import difflib
+try:
+    import orjson  # opcional: codifica/decodifica JSON bem mais rápido que a stdlib
+except ImportError:
+    orjson = None
 
 warnings.filterwarnings("ignore", category=UserWarning, module='openpyxl')
 
@@ -55,27 +58,116 @@ def init_db():
 # Inicializa DB na importação
 init_db()
 
+def _assinatura_arquivo(path):
+    """Chave barata de invalidação do cache: (mtime_ns, tamanho) do arquivo, ou None se não existir."""
+    try:
+        info = os.stat(path)
+        return (info.st_mtime_ns, info.st_size)
+    except OSError:
+        return None
+
+@st.cache_data(show_spinner=False)
+def _ler_json(path, assinatura):
+    # `assinatura` só participa da chave do cache: muda a cada salvar_*, forçando nova leitura.
+    with open(path, "rb") as f:
+        dados = f.read()
+    return orjson.loads(dados) if orjson is not None else json.loads(dados)
+
 def carregar_consultores():
     try:
-        with open(CONSULTORES_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
+        return _ler_json(CONSULTORES_FILE, _assinatura_arquivo(CONSULTORES_FILE))
     except (FileNotFoundError, json.JSONDecodeError):
         return []
 
+def nomes_editados_do_editor(consultores, estado_editor):
+    """{posição original: nome atual} das linhas de `consultores` que o data_editor manteve.
+
+    Usa o estado do widget (`deleted_rows`/`edited_rows`, por posição na lista original)
+    em vez do índice do DataFrame devolvido: o Streamlit reaproveita o índice de uma linha
+    excluída para uma linha nova, e o consultor novo herdaria as equipes do excluído.
+    """
+    excluidas = set(estado_editor.get("deleted_rows", []))
+    edicoes = estado_editor.get("edited_rows", {})
+    nomes = {}
+    for idx, c in enumerate(consultores):
+        if idx in excluidas:
+            continue
+        nome = edicoes.get(idx, {}).get("consultor", c["consultor"])
+        nomes[idx] = str(nome if nome is not None else "").strip()
+    return nomes
+
+def propagar_nomes_equipes(consultores, nomes_editados, equipes):
+    """Aplica nas equipes as exclusões/renomeações feitas na lista de consultores.
+
+    `nomes_editados` mapeia a posição original de cada linha ao novo nome; posições
+    ausentes são linhas excluídas. Retorna True se alguma equipe foi alterada.
+    A pertinência é testada na lista viva de cada equipe: duas linhas com o mesmo
+    nome não tentam remover o mesmo membro duas vezes.
+    """
+    alterou = False
+    for idx, c in enumerate(consultores):
+        antigo_nome = c["consultor"]
+        novo_nome = nomes_editados.get(idx)  # None = linha excluída
+        if novo_nome == antigo_nome:
+            continue
+        for equipe in equipes:
+            membros = equipe["consultores"]
+            if antigo_nome in membros:
+                membros.remove(antigo_nome)
+                if novo_nome is not None:
+                    membros.append(novo_nome)
+                alterou = True
+    return alterou
+
+def _json_bytes(obj):
+    """Serializa `obj` em UTF-8 indentado (2 espaços), com orjson quando disponível."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+    return json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8")
+
+def _escrever_json_tmp(path, obj):
+    """Grava `obj` em `path + '.tmp'` com fsync e retorna o caminho temporário."""
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(_json_bytes(obj))
+        f.flush()
+        os.fsync(f.fileno())
+    return tmp
+
+def _atomic_write_json(path, obj):
+    """Substitui `path` atomicamente: um leitor nunca vê o JSON pela metade."""
+    os.replace(_escrever_json_tmp(path, obj), path)
+
 def salvar_consultores(consultores):
-    with open(CONSULTORES_FILE, "w", encoding="utf-8") as f:
-        json.dump(consultores, f, ensure_ascii=False, indent=2)
+    _atomic_write_json(CONSULTORES_FILE, consultores)
 
 def carregar_equipes():
     try:
-        with open(EQUIPES_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)["equipes"]
+        return _ler_json(EQUIPES_FILE, _assinatura_arquivo(EQUIPES_FILE))["equipes"]
     except (FileNotFoundError, json.JSONDecodeError, KeyError):
         return []
 
 def salvar_equipes(equipes):
-    with open(EQUIPES_FILE, "w", encoding="utf-8") as f:
-        json.dump({"equipes": equipes}, f, ensure_ascii=False, indent=2)
+    _atomic_write_json(EQUIPES_FILE, {"equipes": equipes})
+
+def salvar_estado(consultores, equipes):
+    """Salva consultores e equipes numa única operação.
+
+    Escreve os dois arquivos temporários, faz fsync e só então troca ambos via
+    os.replace, reduzindo a janela em que os dois JSON podem divergir no disco.
+    """
+    pendentes = [
+        (_escrever_json_tmp(CONSULTORES_FILE, consultores), CONSULTORES_FILE),
+        (_escrever_json_tmp(EQUIPES_FILE, {"equipes": equipes}), EQUIPES_FILE),
+    ]
+    for tmp, path in pendentes:
+        os.replace(tmp, path)
+
+def _avisar_recarga_manual():
+    st.warning("Não foi possível recarregar a página automaticamente. Atualize manualmente.")
+
+# Resolvido uma vez no import: versões antigas do Streamlit só têm experimental_rerun.
+_rerun_fn = getattr(st, "rerun", None) or getattr(st, "experimental_rerun", None) or _avisar_recarga_manual
 
 from data_ingestion import load_data, ASSERTIVA_ESSENTIAL_COLS, LEMIT_ESSENTIAL_COLS
 from data_cleaning import clean_and_filter_data, FULL_EXTRACTION_COLS
@@ -89,150 +181,21 @@ COLOR_WHITE = "FFFFFF"
 
 from utils import (
     clean_phone_number,
+    clean_phone_series,
     normalize_cep,
+    normalize_cep_series,
     best_match_column,
     proximo_dia_util,
     determine_localidade,
     generate_excel_buffer,
+    generate_excel_buffers_parallel,
+    PARALLEL_EXCEL_MIN_ROWS,
     format_phone_for_whatsapp_business,
+    format_phone_whatsapp_series,
+    format_phone_whatsapp_series_dedup,
 )
 
 
-def normalize_cep(cep_str):
-    """Normaliza um CEP: remove não dígitos e retorna string com 8 dígitos ou empty string."""
-    if pd.isna(cep_str) or str(cep_str).strip() == '':
-        return ""
-    digits = ''.join(filter(str.isdigit, str(cep_str)))
-    if len(digits) == 8:
-        # Retorna apenas os 8 dígitos (sem traço)
-        return digits
-    elif len(digits) > 8:
-        # Se tiver mais dígitos, pega os 8 últimos (possível prefixo extra)
-        d = digits[-8:]
-        return d
-    else:
-        # Retorna vazio para CEPs inválidos/curtos
-        return ""
-
-
-def best_match_column(df_columns, candidates, min_score=50):
-    """Retorna a melhor coluna de `df_columns` que corresponde aos `candidates`.
-    Usa várias heurísticas combinadas (igualdade, substring, interseção de tokens e similaridade).
-    Retorna string vazia se nenhuma coluna atingir `min_score`.
-    """
-    if not df_columns:
-        return ''
-
-    df_cols = [str(c) for c in df_columns]
-    df_cols_lower = [c.lower() for c in df_cols]
-
-    best_col = ''
-    best_score = 0.0
-
-    for cand in candidates:
-        if not cand:
-            continue
-        cand_l = str(cand).lower()
-        cand_tokens = set([t for t in ''.join(ch if ch.isalnum() else ' ' for ch in cand_l).split() if t])
-
-        for i, col in enumerate(df_cols):
-            col_l = df_cols_lower[i]
-            score = 0.0
-
-            # Exata igualdade (maior peso)
-            if col_l == cand_l:
-                score += 120
-
-            # Substring (col contém candidato ou candidato contém coluna)
-            if cand_l in col_l or col_l in cand_l:
-                score += 80
-
-            # Token overlap
-            col_tokens = set([t for t in ''.join(ch if ch.isalnum() else ' ' for ch in col_l).split() if t])
-            if cand_tokens and col_tokens:
-                inter = cand_tokens.intersection(col_tokens)
-                union = cand_tokens.union(col_tokens)
-                if union:
-                    score += 40 * (len(inter) / len(union))
-
-            # Similaridade fuzzier via SequenceMatcher
-            try:
-                ratio = difflib.SequenceMatcher(a=cand_l, b=col_l).ratio()
-                score += 40 * ratio
-            except Exception:
-                pass
-
-            # Slight preference for shorter column names on ties
-            score -= 0.01 * len(col_l)
-
-            if score > best_score:
-                best_score = score
-                best_col = col
-
-    if best_score >= min_score:
-        return best_col
-    return ''
-
-
-def proximo_dia_util(data_obj):
-    """Retorna o próximo dia útil (pulando sábados e domingos)."""
-    try:
-        next_day = data_obj + timedelta(days=1)
-        while next_day.weekday() >= 5:  # 5 = Saturday, 6 = Sunday
-            next_day += timedelta(days=1)
-        return next_day
-    except Exception:
-        # Se qualquer erro ocorrer (ex: data_obj não é date), tente converter
-        try:
-            next_day = (pd.to_datetime(data_obj) + pd.Timedelta(days=1)).date()
-            while next_day.weekday() >= 5:
-                next_day = (pd.to_datetime(next_day) + pd.Timedelta(days=1)).date()
-            return next_day
-        except Exception:
-            return data_obj
-
-
-def determine_localidade(user_col_mapping, df_lote, default="CG"):
-    """Determina uma string de localidade segura para uso em nomes de arquivos.
-
-    Regras:
-    - Prefere coluna 'UF' quando mapeada e a célula parece ser a sigla (2 letras).
-    - Caso contrário, usa 'Cidade' apenas se for muito curta (<=3 chars).
-    - Caso contrário, retorna `default`.
-    """
-    # Tenta várias chaves comuns para UF
-    possible_uf_keys = ["UF", "Estado", "Estado/UF", "UF/Estado"]
-    for k in possible_uf_keys:
-        uf_col = user_col_mapping.get(k)
-        if uf_col and uf_col in df_lote.columns and not df_lote[uf_col].dropna().empty:
-            val = str(df_lote[uf_col].iloc[0]).strip()
-            if len(val) == 2:
-                return val.upper()
-
-    # Se não houver UF válido, verificar Cidade mas somente se curta (evita nomes longos como 'DOURADOS')
-    cidade_col = user_col_mapping.get("Cidade")
-    if cidade_col and cidade_col in df_lote.columns and not df_lote[cidade_col].dropna().empty:
-        val = str(df_lote[cidade_col].iloc[0]).strip()
-        if 0 < len(val) <= 3:
-            return val.upper()
-
-    return default
-
-
-def gerar_excel_em_memoria(df_lote, consultor, data):
-    """Gera um buffer Excel em memória para um DataFrame (usado por divisor de listas)."""
-    output = io.BytesIO()
-    try:
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df_lote.to_excel(writer, index=False)
-        output.seek(0)
-        return output
-    except Exception:
-        return io.BytesIO()
-
-
- 
-
 def aba_higienizacao():
     # Garante que as variáveis de sessão estejam inicializadas
     if "structure_type" not in st.session_state:
@@ -399,7 +362,7 @@ def aba_higienizacao():
                             st.session_state.manual_df = df_mapped
                             st.session_state.structure_type = "Manual"
                             st.success("Mapeamento aplicado com sucesso! Processando...")
-                            st.rerun()
+                            _rerun_fn()
                             
                         except Exception as e:
                             st.error(f"Erro ao processar o mapeamento: {e}")
@@ -637,7 +600,7 @@ def aba_divisor_listas():
                     # Limpa e filtra pelo número de WhatsApp
                     if "Whats" in df_leads_mapped.columns:
                         initial_rows = len(df_leads_mapped)
-                        df_leads_mapped["Whats"] = df_leads_mapped["Whats"].apply(clean_phone_number)
+                        df_leads_mapped["Whats"] = clean_phone_series(df_leads_mapped["Whats"])
                         df_leads_mapped.dropna(subset=["Whats"], inplace=True)
                         final_rows = len(df_leads_mapped)
                         removed = initial_rows - final_rows
@@ -680,6 +643,19 @@ def aba_divisor_listas():
                         data_atual = start_date
                         total_leads = len(df_leads_mapped)
                         arquivos_gerados = 0
+                        lotes = []
+                        linhas_pendentes = 0
+
+                        def gravar_lotes(lotes):
+                            # Planilhas dos lotes de uma vez (em paralelo quando compensa)
+                            excel_buffers = generate_excel_buffers_parallel([lote[0] for lote in lotes])
+                            for (df_lote, caminho_base, pdf_title), excel_buffer in zip(lotes, excel_buffers):
+                                zip_file.writestr(f"{caminho_base}.xlsx", excel_buffer.getvalue())
+
+                                pdf_buffer = create_pdf_robust(df_lote, title=pdf_title, cols_to_center=cols_to_center, cols_single_checkbox=cols_single_checkbox, cols_double_checkbox=cols_double_checkbox)
+                                
+                                if pdf_buffer:
+                                    zip_file.writestr(f"{caminho_base}.pdf", pdf_buffer.getvalue())
 
                         while leads_processados < total_leads:
                             for consultor in effective_consultores:
@@ -714,8 +690,6 @@ def aba_divisor_listas():
                                         df_lote[col] = "☐   ☐"
                                 
                                 if not df_lote.empty:
-                                    excel_buffer = generate_excel_buffer(df_lote)
-                                    
                                     primeiro_nome = consultor.split(' ')[0]
                                     data_formatada_nome = data_atual.strftime('%d_%m_%Y')
                                     nome_arquivo_base = f"LEADS_AUTOMOVEIS_{primeiro_nome.upper()}_{data_formatada_nome}"
@@ -726,18 +700,24 @@ def aba_divisor_listas():
                                         if consultor in equipe["consultores"]:
                                             nome_equipe = equipe["nome"]
                                             break
-                                    zip_file.writestr(f"{nome_equipe}/{nome_arquivo_base}.xlsx", excel_buffer.getvalue())
 
                                     pdf_title = f"Leads Automoveis - {primeiro_nome} {data_atual.strftime('%d/%m')}"
-                                    pdf_buffer = create_pdf_robust(df_lote, title=pdf_title, cols_to_center=cols_to_center, cols_single_checkbox=cols_single_checkbox, cols_double_checkbox=cols_double_checkbox)
-                                    
-                                    if pdf_buffer:
-                                        zip_file.writestr(f"{nome_equipe}/{nome_arquivo_base}.pdf", pdf_buffer.getvalue())
+                                    lotes.append((df_lote, f"{nome_equipe}/{nome_arquivo_base}", pdf_title))
                                     
                                     leads_processados += len(df_lote)
+                                    linhas_pendentes += len(df_lote)
                                     arquivos_gerados += 1
 
+                            # Junta lotes de várias rodadas até o tamanho em que o pool compensa;
+                            # assim a memória fica limitada a um grupo, não à lista inteira
+                            if linhas_pendentes >= PARALLEL_EXCEL_MIN_ROWS:
+                                gravar_lotes(lotes)
+                                lotes, linhas_pendentes = [], 0
+
                             data_atual = proximo_dia_util(data_atual)
+
+                        if lotes:
+                            gravar_lotes(lotes)
                     
                     st.success(f"Processo concluído! {arquivos_gerados} pares de listas (Excel e PDF) foram gerados.")
 
@@ -1118,7 +1098,7 @@ def aba_gerador_negocios_robos():
                 
                 # Preparar o DataFrame
                 df_renamed = df_raw_leads.rename(columns={nome_col: "Nome", whats_col: "WhatsApp"})
-                df_renamed["WhatsApp"] = df_renamed["WhatsApp"].apply(clean_phone_number)
+                df_renamed["WhatsApp"] = clean_phone_series(df_renamed["WhatsApp"])
                 df_renamed.dropna(subset=["WhatsApp"], inplace=True)
 
                 if df_renamed.empty:
@@ -1176,7 +1156,7 @@ def processar_e_gerar_negocios(negocios_por_consultor, start_date_negocios, nich
 
 
                     # Limpar e formatar WhatsApp para uso em Data de Conclusão - USANDO PRESERVE_FULL para evitar cortes incorretos
-                    leads_do_consultor["WhatsApp_Clean"] = leads_do_consultor["WhatsApp"].apply(lambda x: clean_phone_number(x, preserve_full=True))
+                    leads_do_consultor["WhatsApp_Clean"] = clean_phone_series(leads_do_consultor["WhatsApp"], preserve_full=True)
                     leads_do_consultor["WhatsApp_Clean"] = leads_do_consultor["WhatsApp_Clean"].apply(lambda x: str(x) if pd.notna(x) else "")
 
                     num_leads_consultor = len(leads_do_consultor)
@@ -1184,54 +1164,43 @@ def processar_e_gerar_negocios(negocios_por_consultor, start_date_negocios, nich
                     current_date = start_date_negocios
                     file_counter = 1
 
+                    # Campos constantes montados uma única vez; por linha só mudam os campos do lead
+                    nicho_formatado_titulo = nicho_principal.upper()
+                    if sufixo_localidade:
+                        nicho_formatado_titulo += f" {sufixo_localidade.upper()}"
+                    base_negocio = {col: "" for col in colunas_negocios}
+                    base_negocio.update({
+                        "Funil": "Funil de Vendas",
+                        "Etapa": "Prospecção",
+                        "Status": "Em andamento",
+                    })
+
                     while leads_processados_consultor < num_leads_consultor:
                         inicio_lote = leads_processados_consultor
                         fim_lote = min(leads_processados_consultor + negocios_por_consultor, num_leads_consultor)
                         df_lote_negocios = leads_do_consultor.iloc[inicio_lote:fim_lote].copy()
 
                         if not df_lote_negocios.empty:
-                            dados_negocios = []
-                            for _, row_lead in df_lote_negocios.iterrows():
-                                nome_pessoa = row_lead.get("Nome", "")
-                                usuario_responsavel = row_lead.get("Usuário responsável", "")
-                                whatsapp_lead = row_lead.get("WhatsApp_Clean", "")
-                                
-                                # Lógica inteligente de DDI (Centralizada)
-                                whatsapp_lead_full, status_phone = format_phone_for_whatsapp_business(whatsapp_lead)
-                                
-                                if status_phone == "VAZIO":
-                                    processing_logs.append(f"❌ [Handoff] {nome_pessoa}: Sem WhatsApp válido. Campo Data de Conclusão ficará vazio.")
-                                elif status_phone == "INVÁLIDO (Curto)":
-                                    processing_logs.append(f"⚠️ [Handoff] {nome_pessoa}: Número curto detectado ({whatsapp_lead}).")
-
-                                # Formatar Título do negócio usando a data do arquivo (current_date)
-                                mes_ano = current_date.strftime('%m/%y')
-                                nicho_formatado_titulo = nicho_principal.upper()
-                                if sufixo_localidade:
-                                    nicho_formatado_titulo += f" {sufixo_localidade.upper()}"
-                                
-                                titulo_negocio = f"{mes_ano} - RB - {nicho_formatado_titulo} - {nome_pessoa}/ESPs"
-
-                                linha_negocio = {
-                                    "Título do negócio": titulo_negocio,
-                                    "Empresa relacionada": "", # Deixar em branco
-                                    "Pessoa relacionada": nome_pessoa,
-                                    "Usuário responsável": usuario_responsavel,
-                                    "Data de início": current_date.strftime('%d/%m/%Y'),
-                                    "Data de conclusão": whatsapp_lead_full, # WhatsApp com DDI +55
-                                    "Valor Total": "", # Deixar em branco
-                                    "Funil": "Funil de Vendas",
-                                    "Etapa": "Prospecção",
-                                    "Status": "Em andamento",
-                                    "Motivo de perda": "", # Deixar em branco
-                                    "Descrição do motivo de perda": "", # Deixar em branco
-                                    "Ranking": "", # Deixar em branco
-                                    "Descrição": "", # Deixar em branco
-                                    "Produtos e Serviços": "" # Deixar em branco
-                                }
-                                dados_negocios.append(linha_negocio)
-                            
-                            df_final_negocios = pd.DataFrame(dados_negocios, columns=colunas_negocios)
+                            # Formatar Título do negócio usando a data do arquivo (current_date)
+                            prefixo_titulo = f"{current_date.strftime('%m/%y')} - RB - {nicho_formatado_titulo} - "
+                            base_lote = {**base_negocio, "Data de início": current_date.strftime('%d/%m/%Y')}
+                            nomes = _valores_coluna(df_lote_negocios, "Nome")
+
+                            # Lógica inteligente de DDI (Centralizada), para o lote inteiro de uma vez
+                            whatsapp_full, status_phone = format_phone_whatsapp_series(
+                                pd.Series(_valores_coluna(df_lote_negocios, "WhatsApp_Clean")))
+                            processing_logs.extend(
+                                f"❌ [Handoff] {nome_pessoa}: Sem WhatsApp válido. Campo Data de Conclusão ficará vazio."
+                                for nome_pessoa in nomes[status_phone.to_numpy() == "VAZIO"]
+                            )
+
+                            df_final_negocios = pd.DataFrame({
+                                **base_lote,
+                                "Título do negócio": [f"{prefixo_titulo}{nome_pessoa}/ESPs" for nome_pessoa in nomes],
+                                "Pessoa relacionada": nomes,
+                                "Usuário responsável": _valores_coluna(df_lote_negocios, "Usuário responsável"),
+                                "Data de conclusão": whatsapp_full.to_numpy(),  # WhatsApp com DDI +55
+                            }, index=range(len(nomes)), columns=colunas_negocios)
 
                             output_excel_negocios = generate_excel_buffer(df_final_negocios)
 
@@ -1260,7 +1229,7 @@ def processar_e_gerar_negocios(negocios_por_consultor, start_date_negocios, nich
             # Preparar o DataFrame
             df_renamed = df_raw.rename(columns={col_mapping["Nome"]: "Nome", col_mapping["WhatsApp"]: "WhatsApp"})
             # Usar preserve_full=True para não cortar dígitos inadvertidamente
-            df_renamed["WhatsApp"] = df_renamed["WhatsApp"].apply(lambda x: clean_phone_number(x, preserve_full=True))
+            df_renamed["WhatsApp"] = clean_phone_series(df_renamed["WhatsApp"], preserve_full=True)
             
             # Count dropped rows for logging
             initial_count = len(df_renamed)
@@ -1311,58 +1280,43 @@ def processar_e_gerar_negocios(negocios_por_consultor, start_date_negocios, nich
                 current_date = start_date_negocios
                 file_counter = 1
 
+                # Campos constantes do consultor montados uma única vez (inclui o usuário responsável)
+                nicho_formatado_titulo = nicho_principal.upper()
+                if sufixo_localidade:
+                    nicho_formatado_titulo += f" {sufixo_localidade.upper()}"
+                base_negocio = {col: "" for col in colunas_negocios}
+                base_negocio.update({
+                    "Usuário responsável": consultor.lower().replace(' ', '.'),
+                    "Funil": "Funil de Vendas",
+                    "Etapa": "Prospecção",
+                })
+
                 while leads_processados < total_leads:
                     inicio_lote = leads_processados
                     fim_lote = min(leads_processados + negocios_por_consultor, total_leads)
                     df_lote_negocios = df_consultor.iloc[inicio_lote:fim_lote].copy()
                     
                     if not df_lote_negocios.empty:
-                        dados_negocios = []
-                        for _, row_lead in df_lote_negocios.iterrows():
-                            nome_pessoa = row_lead.get("Nome", "")
-                            usuario_responsavel = consultor.lower().replace(' ', '.')
-                            whatsapp_lead = row_lead.get("WhatsApp", "")
-                            
-                            # Clean once
-                            cleaned = clean_phone_number(whatsapp_lead, preserve_full=True)
-                            whatsapp_lead_clean = str(cleaned) if pd.notna(cleaned) else ""
-                            
-                            # Lógica inteligente de DDI para Upload Cru + Flagging (Centralizada)
-                            whatsapp_lead_full, status_telefone = format_phone_for_whatsapp_business(whatsapp_lead_clean)
-
-                            if status_telefone == "VAZIO":
-                                processing_logs.append(f"❌ [Upload] {nome_pessoa}: WhatsApp vazio após limpeza.")
-                            elif status_telefone == "INVÁLIDO (Curto)":
-                                processing_logs.append(f"⚠️ [Upload] {nome_pessoa}: Número curto ({whatsapp_lead_clean}).")
-
+                        # Use the file's current_date for month/year in title
+                        prefixo_titulo = f"{current_date.strftime('%m/%y')} - RB - {nicho_formatado_titulo} - "
+                        base_lote = {**base_negocio, "Data de início": current_date.strftime('%d/%m/%Y')}
+                        nomes = _valores_coluna(df_lote_negocios, "Nome")
+
+                        # Clean once, then DDI logic for Upload Cru + Flagging (Centralizada), column-wise
+                        whatsapp_clean = clean_phone_series(pd.Series(_valores_coluna(df_lote_negocios, "WhatsApp")), preserve_full=True)
+                        whatsapp_full, status_telefone = format_phone_whatsapp_series(whatsapp_clean.fillna(""))
+                        processing_logs.extend(
+                            f"❌ [Upload] {nome_pessoa}: WhatsApp vazio após limpeza."
+                            for nome_pessoa in nomes[status_telefone.to_numpy() == "VAZIO"]
+                        )
 
-                            # Use the file's current_date for month/year in title
-                            mes_ano = current_date.strftime('%m/%y')
-                            nicho_formatado_titulo = nicho_principal.upper()
-                            if sufixo_localidade:
-                                nicho_formatado_titulo += f" {sufixo_localidade.upper()}"
-                            titulo_negocio = f"{mes_ano} - RB - {nicho_formatado_titulo} - {nome_pessoa}/ESPs"
-
-                            linha_negocio = {
-                                "Título do negócio": titulo_negocio,
-                                "Empresa relacionada": "",
-                                "Pessoa relacionada": nome_pessoa,
-                                "Usuário responsável": usuario_responsavel,
-                                "Data de início": current_date.strftime('%d/%m/%Y'),
-                                "Data de conclusão": whatsapp_lead_full,
-                                "Valor Total": "",
-                                "Funil": "Funil de Vendas",
-                                "Etapa": "Prospecção",
-                                "Motivo de perda": "",
-                                "Descrição do motivo de perda": "",
-                                "Ranking": "",
-                                "Descrição": "",
-                                "Produtos e Serviços": "",
-                                "Status Telefone": status_telefone # New Column
-                            }
-                            dados_negocios.append(linha_negocio)
-                        
-                        df_final_negocios = pd.DataFrame(dados_negocios, columns=colunas_negocios)
+                        df_final_negocios = pd.DataFrame({
+                            **base_lote,
+                            "Título do negócio": [f"{prefixo_titulo}{nome_pessoa}/ESPs" for nome_pessoa in nomes],
+                            "Pessoa relacionada": nomes,
+                            "Data de conclusão": whatsapp_full.to_numpy(),
+                            "Status Telefone": status_telefone.to_numpy(),
+                        }, index=range(len(nomes)), columns=colunas_negocios)
 
                         # Preparação do conteúdo para o Excel (Multiplas Abas ou Única)
                         excel_payload = df_final_negocios # Default: Só o DF principal
@@ -1374,10 +1328,8 @@ def processar_e_gerar_negocios(negocios_por_consultor, start_date_negocios, nich
                             lista_telefones_lote = []
                             seen_phones = set()
                             
-                            for row in dados_negocios:
-                                # O telefone validado foi salvo na coluna "Data de conclusão" (hack legado do usuário)
-                                phone_val = row.get("Data de conclusão") 
-                                
+                            # O telefone validado foi salvo na coluna "Data de conclusão" (hack legado do usuário)
+                            for phone_val in df_final_negocios["Data de conclusão"]:
                                 if phone_val and str(phone_val).strip():
                                     p_clean = str(phone_val).strip()
                                     # Validação extra para garantir que parece um telefone
@@ -1416,16 +1368,12 @@ def processar_e_gerar_negocios(negocios_por_consultor, start_date_negocios, nich
             # Nome do zip: se só um consultor, usa o nome dele, senão usa "varios"
             if len(effective_consultores) == 1:
                 # Buscar usuário do consultor
-                usuario = None
-                try:
-                    with open(CONSULTORES_FILE, "r", encoding="utf-8") as f:
-                        consultores_data = json.load(f)
-                        for c in consultores_data:
-                            if c["consultor"].strip().lower() == effective_consultores[0].strip().lower():
-                                usuario = c["usuario"].replace(" ", "_").lower()
-                                break
-                except Exception:
-                    usuario = effective_consultores[0].replace(" ", "_").lower()
+                nome_alvo = effective_consultores[0].strip().lower()
+                usuario = next(
+                    (c["usuario"] for c in carregar_consultores() if c["consultor"].strip().lower() == nome_alvo),
+                    effective_consultores[0],
+                )
+                usuario = usuario.replace(" ", "_").lower()
                 zip_filename = f"Negocios_Robos_{usuario}.zip"
             else:
                 zip_filename = f"Negocios_Robos_varios.zip"
@@ -1456,6 +1404,77 @@ def processar_e_gerar_negocios(negocios_por_consultor, start_date_negocios, nich
 
 
 
+def _valores_coluna(df, col, default=""):
+    """Retorna os valores de `col` como array de objetos, ou `default` repetido se a coluna não existir."""
+    if col and col in df.columns:
+        return df[col].to_numpy(dtype=object)
+    return np.full(len(df), default, dtype=object)
+
+
+def montar_linhas_pessoas(df_lote, colunas_output, consultor_formatado, default_cargo,
+                          desc_mode, default_descricao, col_descricao, uf_mode, default_uf, col_uf):
+    """Monta as linhas do arquivo 'Pessoas' (Agendor) coluna a coluna.
+
+    Em vez de iterar com iterrows (uma Series alocada por linha), cada coluna de entrada
+    (Whats, CEL, CEP, NOME, ...) é extraída uma única vez como array e as colunas de
+    saída são calculadas sobre esses arrays. Retorna um DataFrame com `colunas_output`.
+    """
+    n = len(df_lote)
+
+    whats = _valores_coluna(df_lote, "Whats", None)
+    whatsapp_out = [f"+55{str(v).strip()}" if v and pd.notna(v) and str(v).strip() else "" for v in whats]
+
+    celular = _valores_coluna(df_lote, "CEL", None)
+    celular_out = [str(v) if v and pd.notna(v) else "" for v in celular]
+
+    # Lógica para Descrição
+    if desc_mode == "Valor Fixo":
+        descricao_out = [default_descricao.strip()] * n
+    elif col_descricao and col_descricao in df_lote.columns:
+        descricao_out = [str(v).strip() if pd.notna(v) else "" for v in _valores_coluna(df_lote, col_descricao)]
+    else:
+        descricao_out = [""] * n
+
+    # Fallback original se estiver vazio
+    razao = _valores_coluna(df_lote, "Razao Social", None)
+    fantasia = _valores_coluna(df_lote, "Fantasia", None)
+    empresa = _valores_coluna(df_lote, "Empresa", None)
+    descricao_out = [d if d else (r or f or e or "") for d, r, f, e in zip(descricao_out, razao, fantasia, empresa)]
+
+    # Lógica para UF
+    if uf_mode == "Valor Fixo":
+        uf_out = [default_uf or "MS"] * n
+    elif col_uf and col_uf in df_lote.columns:
+        uf_out = [(str(v).strip()[0:2].upper() if pd.notna(v) else "") or "MS" for v in _valores_coluna(df_lote, col_uf)]
+    else:
+        uf_out = ["MS"] * n
+
+    if "CEP" in df_lote.columns:
+        cep_out = normalize_cep_series(df_lote["CEP"]).to_numpy(dtype=object)
+    else:
+        cep_out = [""] * n
+
+    dados = {col: "" for col in colunas_output}
+    dados.update({
+        "Nome": _valores_coluna(df_lote, "NOME"),
+        "Cargo": default_cargo,
+        "Usuário responsável": consultor_formatado,
+        "Categoria": "Lead",
+        "Origem": "Reobote",
+        "Descrição": descricao_out,
+        "WhatsApp": whatsapp_out,
+        "Celular": celular_out,
+        "Estado": uf_out,
+        "Cidade": _valores_coluna(df_lote, "Cidade"),
+        "Bairro": _valores_coluna(df_lote, "Bairro"),
+        "Rua": _valores_coluna(df_lote, "Rua"),
+        "Número": _valores_coluna(df_lote, "Número"),
+        "Complemento": _valores_coluna(df_lote, "Complemento"),
+        "CEP": cep_out,
+    })
+    return pd.DataFrame(dados, index=range(n), columns=colunas_output)
+
+
 def aba_automacao_pessoas_agendor():
     st.header("Automação Pessoas Agendor")
     # st.write("### Automação de Lista - Pessoas (Agendor)") 
@@ -1887,7 +1906,7 @@ def aba_automacao_pessoas_agendor():
                     # Limpa e filtra pelo número de WhatsApp
                     if "Whats" in df_leads_mapped.columns:
                         initial_rows = len(df_leads_mapped)
-                        df_leads_mapped["Whats"] = df_leads_mapped["Whats"].apply(clean_phone_number)
+                        df_leads_mapped["Whats"] = clean_phone_series(df_leads_mapped["Whats"])
                         df_leads_mapped.dropna(subset=["Whats"], inplace=True)
                         final_rows = len(df_leads_mapped)
                         final_rows = len(df_leads_mapped)
@@ -1910,7 +1929,7 @@ def aba_automacao_pessoas_agendor():
                     if "CEL" in df_leads_mapped.columns:
                         # Para o campo 'Celular' preservamos todos os dígitos completos
                         # (evita remover o primeiro dígito do DDD). Use preserve_full=True.
-                        df_leads_mapped["CEL"] = df_leads_mapped["CEL"].apply(lambda x: clean_phone_number(x, preserve_full=True))
+                        df_leads_mapped["CEL"] = clean_phone_series(df_leads_mapped["CEL"], preserve_full=True)
                         # Replace NaN with empty string for easier usage later
                         df_leads_mapped["CEL"] = df_leads_mapped["CEL"].fillna("")
                     
@@ -1946,67 +1965,16 @@ def aba_automacao_pessoas_agendor():
                     
                     if len(effective_consultores) == 1 and not force_split:
                         consultor = effective_consultores[0]
-                        dados_finais = []
                         consultor_formatado = consultor.lower().replace(' ', '.')
-                        df_lote = df_leads_mapped.copy()
-                        for _, row in df_lote.iterrows():
-                            whatsapp_val = row.get("Whats")
-                            whatsapp_str = f"+55{str(whatsapp_val).strip()}" if whatsapp_val and pd.notna(whatsapp_val) and str(whatsapp_val).strip() else ""
-                            celular_val = row.get("CEL")
-                            celular_str = str(celular_val) if celular_val and pd.notna(celular_val) else ""
-                            
-                            
-                            # Lógica para Descrição
-                            descricao_val = ""
-                            if desc_mode == "Valor Fixo":
-                                descricao_val = default_descricao.strip()
-                            elif col_descricao and col_descricao in row:
-                                val_col = row.get(col_descricao)
-                                descricao_val = str(val_col).strip() if pd.notna(val_col) else ""
-                            
-                            # Fallback original se estiver vazio
-                            if not descricao_val:
-                                descricao_val = row.get("Razao Social") or row.get("Fantasia") or row.get("Empresa") or ""
-
-                            # Lógica para UF
-                            uf_val = ""
-                            if uf_mode == "Valor Fixo":
-                                uf_val = default_uf
-                            elif col_uf and col_uf in row:
-                                val_uf = row.get(col_uf)
-                                uf_val = str(val_uf).strip()[0:2].upper() if pd.notna(val_uf) else ""
-                            
-                            if not uf_val: # Fallback safe
-                                uf_val = "MS"
-                            cep_val = ""
-                            if "CEP" in row and pd.notna(row.get("CEP")):
-                                cep_val = normalize_cep(row.get("CEP"))
-                            linha = {col: "" for col in colunas_output}
-                            linha.update({
-                                "Nome": row.get("NOME", ""),
-                                # Fix: Populate Empresa with empty string as requested
-                                "Empresa": "",
-                                "Cargo": default_cargo,
-                                "Usuário responsável": consultor_formatado,
-                                "Categoria": "Lead",
-                                "Origem": "Reobote",
-                                "Descrição": descricao_val,
-                                "WhatsApp": whatsapp_str,
-                                "Celular": celular_str,
-                                "Estado": uf_val,
-                                "Cidade": row.get("Cidade", ""),
-                                "Bairro": row.get("Bairro", ""),
-                                "Rua": row.get("Rua", ""),
-                                "Número": row.get("Número", ""),
-                                "Complemento": row.get("Complemento", ""),
-                                "CEP": cep_val
-                            })
-                            dados_finais.append(linha)
-                        
+                        df_lote = df_leads_mapped
+                        df_final_consultor = montar_linhas_pessoas(
+                            df_lote, colunas_output, consultor_formatado, default_cargo,
+                            desc_mode, default_descricao, col_descricao, uf_mode, default_uf, col_uf
+                        )
+
                         # Fix: Populate buffer so downstream logic works
-                        consultant_buffer = {consultor: dados_finais}
+                        consultant_buffer = {consultor: [df_final_consultor]}
 
-                        df_final_consultor = pd.DataFrame(dados_finais, columns=colunas_output)
                         output_excel_consultor = generate_excel_buffer(df_final_consultor, sheet_name='Pessoas')
 
                         # Determine localidade for filename (safer logic)
@@ -2031,68 +1999,21 @@ def aba_automacao_pessoas_agendor():
 
                                 inicio_lote = leads_processados
                                 fim_lote = leads_processados + leads_por_consultor
-                                df_lote = df_leads_mapped.iloc[inicio_lote:fim_lote].copy()
+                                df_lote = df_leads_mapped.iloc[inicio_lote:fim_lote]
 
                                 if not df_lote.empty:
                                     consultor_formatado = consultor.lower().replace(' ', '.')
-                                    for _, row in df_lote.iterrows():
-                                        whatsapp_val = row.get("Whats")
-                                        whatsapp_str = f"+55{str(whatsapp_val).strip()}" if whatsapp_val and pd.notna(whatsapp_val) and str(whatsapp_val).strip() else ""
-                                        celular_val = row.get("CEL")
-                                        celular_str = str(celular_val) if celular_val and pd.notna(celular_val) else ""
-                                        
-                                        # Lógica para Descrição
-                                        descricao_val = ""
-                                        if desc_mode == "Valor Fixo":
-                                            descricao_val = default_descricao.strip()
-                                        elif col_descricao and col_descricao in row:
-                                            val_col = row.get(col_descricao)
-                                            descricao_val = str(val_col).strip() if pd.notna(val_col) else ""
-                                        
-                                        # Fallback original
-                                        if not descricao_val:
-                                            descricao_val = row.get("Razao Social") or row.get("Fantasia") or row.get("Empresa") or ""
-                                            
-                                        # Lógica para UF
-                                        uf_val = ""
-                                        if uf_mode == "Valor Fixo":
-                                            uf_val = default_uf
-                                        elif col_uf and col_uf in row:
-                                            val_uf = row.get(col_uf)
-                                            uf_val = str(val_uf).strip()[0:2].upper() if pd.notna(val_uf) else ""
-                                        
-                                        if not uf_val:
-                                            uf_val = "MS"
-                                        cep_val = ""
-                                        if "CEP" in row and pd.notna(row.get("CEP")):
-                                            cep_val = normalize_cep(row.get("CEP"))
-                                        
-                                        linha = {col: "" for col in colunas_output}
-                                        linha.update({
-                                            "Nome": row.get("NOME", ""),
-                                            "Cargo": default_cargo,
-                                            "Usuário responsável": consultor_formatado,
-                                            "Categoria": "Lead",
-                                            "Origem": "Reobote",
-                                            "Descrição": descricao_val,
-                                            "WhatsApp": whatsapp_str,
-                                            "Celular": celular_str,
-                                            "Estado": uf_val,
-                                            "Cidade": row.get("Cidade", ""),
-                                            "Bairro": row.get("Bairro", ""),
-                                            "Rua": row.get("Rua", ""),
-                                            "Número": row.get("Número", ""),
-                                            "Complemento": row.get("Complemento", ""),
-                                            "CEP": cep_val
-                                        })
-                                        consultant_buffer[consultor].append(linha)
+                                    consultant_buffer[consultor].append(montar_linhas_pessoas(
+                                        df_lote, colunas_output, consultor_formatado, default_cargo,
+                                        desc_mode, default_descricao, col_descricao, uf_mode, default_uf, col_uf
+                                    ))
 
                                     leads_processados += len(df_lote)
 
                         # Generate files from buffer
-                        for consultor, dados_finais in consultant_buffer.items():
-                            if dados_finais:
-                                df_final_consultor = pd.DataFrame(dados_finais, columns=colunas_output)
+                        for consultor, lotes_consultor in consultant_buffer.items():
+                            if lotes_consultor:
+                                df_final_consultor = pd.concat(lotes_consultor, ignore_index=True)
                                 output_excel_consultor = generate_excel_buffer(df_final_consultor, sheet_name='Pessoas')
 
                                 nicho_formatado = nicho_valor.upper().replace(' ', '_')
@@ -2109,11 +2030,8 @@ def aba_automacao_pessoas_agendor():
                     
                     # Consolidate all generated data for Reconciliation Source of Truth
                     # This ensures the 'Clean File' matches the structure of the files sent to Agendor
-                    all_final_records = []
-                    for consultor, dados_finais in consultant_buffer.items():
-                        all_final_records.extend(dados_finais)
-                    
-                    df_consolidated_output = pd.DataFrame(all_final_records, columns=colunas_output)
+                    all_final_frames = [lote for lotes_consultor in consultant_buffer.values() for lote in lotes_consultor]
+                    df_consolidated_output = pd.concat(all_final_frames, ignore_index=True)
 
                     # Salva os arquivos gerados no estado da sessão para o handoff
                     st.session_state.generated_pessoas_files = generated_files
@@ -2238,7 +2156,7 @@ def aba_automacao_pessoas_agendor():
                                 df_original_source = pd.read_excel(orig_file, dtype=str)
                             
                             if "Whats" in df_original_source.columns:
-                                df_original_source["Whats"] = df_original_source["Whats"].apply(lambda x: format_phone_for_whatsapp_business(x, include_country_code=False)[0])
+                                df_original_source["Whats"] = format_phone_whatsapp_series_dedup(df_original_source["Whats"], include_country_code=False)[0]
                                 
                             st.success("Arquivo Original Carregado.")
                         except Exception as e:
@@ -2253,10 +2171,11 @@ def aba_automacao_pessoas_agendor():
                     
                     # Salva no estado
                     st.session_state.recon_df_safe = df_safe
-                    st.session_state.recon_df_manual = df_manual
+                    # Coerção para texto feita uma única vez (evita bugs de float no editor)
+                    st.session_state.recon_df_manual = df_manual.astype("string")
                     st.session_state.recon_stats = stats
                     st.session_state.recon_complete = True
-                    st.rerun() # Refresh para mostrar editores
+                    _rerun_fn() # Refresh para mostrar editores
                 except Exception as e:
                     st.error(f"Erro ao processar reconciliação: {e}")
                     
@@ -2290,13 +2209,9 @@ def aba_automacao_pessoas_agendor():
             if not df_manual.empty:
                 st.warning(f"⚠️ **{len(df_manual)} leads precisam de ajuste.** Edite os campos abaixo (ex: Cidade, Email) e confirme.")
                 
-                # Configuração do Editor para evitar bugs de float
-                column_config = {
-                    column: st.column_config.TextColumn(column) 
-                    for column in df_manual.columns
-                }
+                # Demais colunas usam o padrão do Streamlit (já são texto, ver coerção na análise)
                 # Destaque para Motivo
-                column_config["MOTIVO_ERRO"] = st.column_config.TextColumn("Motivo do Erro", disabled=True)
+                column_config = {"MOTIVO_ERRO": st.column_config.TextColumn("Motivo do Erro", disabled=True)}
                 
                 edited_df = st.data_editor(
                     df_manual,
@@ -2307,19 +2222,18 @@ def aba_automacao_pessoas_agendor():
                 )
                 
                 if st.button("✅ Confirmar Correções e Gerar Arquivo Final"):
-                    # Fusão: Safe + Edited
+                    # Fusão: Safe + Edited (escritos em sequência na mesma aba, sem concatenar)
                     df_safe = st.session_state.recon_df_safe
-                    df_final_reconciled = pd.concat([df_safe, edited_df], ignore_index=True)
-                    
+
                     # Gerar Excel
-                    output_buffer = generate_excel_buffer(df_final_reconciled, sheet_name='Pessoas')
+                    output_buffer = generate_excel_buffer([df_safe, edited_df], sheet_name='Pessoas')
                     
                     # Salvar no Session State para persistencia do botão
                     timestamp = datetime.now().strftime('%H%M')
                     st.session_state.recon_final_bytes = output_buffer.getvalue()
                     st.session_state.recon_final_name = f"PESSOAS_CORRIGIDO_{timestamp}.xlsx"
                     st.session_state.recon_download_ready = True
-                    st.rerun()
+                    _rerun_fn()
 
                 # Botão de Download Persistente (fora do if st.button)
                 if st.session_state.get("recon_download_ready"):
@@ -2369,189 +2283,132 @@ def aba_gerenciar_consultores():
 
 
 
-    # Formulário para adicionar novo consultor (só mostra se não está editando)
-    if "edit_idx" not in st.session_state:
-        st.subheader("Adicionar novo consultor")
-        with st.form("add_consultor_form"):
-            novo_usuario = st.text_input("Nome de usuário do consultor")
-            novo_consultor = st.text_input("Nome do consultor (exibição)")
-            submitted_add = st.form_submit_button("Adicionar consultor")
-            if submitted_add:
+    # Formulário para adicionar novo consultor
+    st.subheader("Adicionar novo consultor")
+    with st.form("add_consultor_form"):
+        novo_usuario = st.text_input("Nome de usuário do consultor")
+        novo_consultor = st.text_input("Nome do consultor (exibição)")
+        submitted_add = st.form_submit_button("Adicionar consultor")
+        if submitted_add:
+            try:
+                if not novo_usuario.strip() or not novo_consultor.strip():
+                    st.warning("Preencha todos os campos para adicionar um consultor.")
+                elif any(c["usuario"] == novo_usuario and c["consultor"] == novo_consultor for c in consultores):
+                    st.warning("Já existe um consultor com esse usuário e nome.")
+                else:
+                    consultores.append({"usuario": novo_usuario, "consultor": novo_consultor})
+                    salvar_consultores(consultores)
+                    st.success(f"Consultor '{novo_consultor}' adicionado!")
+                    _rerun_fn()
+            except Exception as e:
+                st.error(f"Erro ao adicionar consultor: {e}")
+
+    with st.expander("Lista de consultores cadastrados", expanded=False):
+        if consultores:
+            # Um único data_editor substitui os botões Editar/Excluir por linha:
+            # as alterações só são aplicadas (e salvas de uma vez) no submit do form.
+            df_consultores = pd.DataFrame(consultores, columns=["usuario", "consultor"])
+            with st.form("consultores_editor_form", border=False):
+                df_editado = st.data_editor(
+                    df_consultores,
+                    num_rows="dynamic",
+                    hide_index=True,
+                    use_container_width=True,
+                    key="consultores_editor",
+                    column_config={
+                        "usuario": st.column_config.TextColumn("Nome de usuário", required=True),
+                        "consultor": st.column_config.TextColumn("Nome do consultor (exibição)", required=True),
+                    },
+                )
+                salvar_lista = st.form_submit_button("Salvar alterações")
+            if salvar_lista:
                 try:
-                    if not novo_usuario.strip() or not novo_consultor.strip():
-                        st.warning("Preencha todos os campos para adicionar um consultor.")
-                    elif any(c["usuario"] == novo_usuario and c["consultor"] == novo_consultor for c in consultores):
+                    df_editado = df_editado.fillna("").astype(str)
+                    novos = [
+                        {"usuario": u.strip(), "consultor": n.strip()}
+                        for u, n in zip(df_editado["usuario"], df_editado["consultor"])
+                    ]
+                    pares = [(c["usuario"], c["consultor"]) for c in novos]
+                    if any(not u or not n for u, n in pares):
+                        st.warning("Preencha todos os campos para editar o consultor.")
+                    elif len(set(pares)) != len(pares):
                         st.warning("Já existe um consultor com esse usuário e nome.")
+                    elif novos == consultores:
+                        st.info("Nenhuma alteração para salvar.")
                     else:
-                        consultores.append({"usuario": novo_usuario, "consultor": novo_consultor})
-                        salvar_consultores(consultores)
-                        st.success(f"Consultor '{novo_consultor}' adicionado!")
-                        try:
-                            st.rerun()
-                        except AttributeError:
-                            st.warning("Não foi possível recarregar a página automaticamente. Atualize manualmente.")
+                        nomes_editados = nomes_editados_do_editor(
+                            consultores, st.session_state.get("consultores_editor", {})
+                        )
+                        # Só reescreve equipes.json se algum nome excluído/renomeado estiver em uma equipe.
+                        if propagar_nomes_equipes(consultores, nomes_editados, equipes):
+                            salvar_estado(novos, equipes)
+                        else:
+                            salvar_consultores(novos)
+                        st.success("Consultores atualizados!")
+                        _rerun_fn()
                 except Exception as e:
-                    st.error(f"Erro ao adicionar consultor: {e}")
-
-    # Expander deve ficar aberto se estiver editando
-    expanded_consultores = "edit_idx" in st.session_state
-
-    with st.expander("Lista de consultores cadastrados", expanded=expanded_consultores):
-        if consultores:
-            for idx, c in enumerate(consultores):
-                unique_id = f"{c['usuario']}__{c['consultor']}__{idx}"
-                if "edit_idx" in st.session_state and st.session_state["edit_idx"] == idx:
-                    # Modo edição inline
-                    st.markdown(f"**Editando consultor {c['consultor']} (usuário: {c['usuario']})**")
-                    with st.form(f"edit_consultor_form_{idx}"):
-                        novo_usuario = st.text_input("Nome de usuário", value=st.session_state["edit_usuario"])
-                        novo_consultor = st.text_input("Nome do consultor (exibição)", value=st.session_state["edit_consultor"])
-                        colsave, colcancel = st.columns([2,2])
-                        with colsave:
-                            submitted_edit = st.form_submit_button("Salvar alterações")
-                        with colcancel:
-                            cancel_edit = st.form_submit_button("Cancelar")
-                        if submitted_edit:
-                            try:
-                                if not novo_usuario.strip() or not novo_consultor.strip():
-                                    st.warning("Preencha todos os campos para editar o consultor.")
-                                elif any(i != st.session_state["edit_idx"] and c["usuario"] == novo_usuario and c["consultor"] == novo_consultor for i, c in enumerate(consultores)):
-                                    st.warning("Já existe um consultor com esse usuário e nome.")
-                                else:
-                                    idx = st.session_state["edit_idx"]
-                                    antigo_nome = consultores[idx]["consultor"]
-                                    consultores[idx] = {"usuario": novo_usuario, "consultor": novo_consultor}
-                                    salvar_consultores(consultores)
-                                    for equipe in equipes:
-                                        if antigo_nome in equipe["consultores"]:
-                                            equipe["consultores"].remove(antigo_nome)
-                                            equipe["consultores"].append(novo_consultor)
-                                    salvar_equipes(equipes)
-                                    st.success("Consultor atualizado!")
-                                    del st.session_state["edit_idx"]
-                                    del st.session_state["edit_usuario"]
-                                    del st.session_state["edit_consultor"]
-                                    try:
-                                        st.rerun()
-                                    except AttributeError:
-                                        st.warning("Não foi possível recarregar a página automaticamente. Atualize manualmente.")
-                            except Exception as e:
-                                st.error(f"Erro ao editar consultor: {e}")
-                        if cancel_edit:
-                            del st.session_state["edit_idx"]
-                            del st.session_state["edit_usuario"]
-                            del st.session_state["edit_consultor"]
-                            try:
-                                st.rerun()
-                            except AttributeError:
-                                st.warning("Não foi possível recarregar a página automaticamente. Atualize manualmente.")
-                else:
-                    col1, col2, col3 = st.columns([4, 3, 2])
-                    with col1:
-                        st.write(f"{idx+1}. {c['consultor']} (usuário: {c['usuario']})")
-                    with col2:
-                        if st.button("Editar", key=f"edit_{unique_id}"):
-                            st.session_state["edit_idx"] = idx
-                            st.session_state["edit_usuario"] = c["usuario"]
-                            st.session_state["edit_consultor"] = c["consultor"]
-                            st.session_state["abrir_expander_consultores"] = True
-                            try:
-                                st.rerun()
-                            except AttributeError:
-                                st.warning("Não foi possível recarregar a página automaticamente. Atualize manualmente.")
-                    with col3:
-                        if st.button("Excluir", key=f"delete_{unique_id}"):
-                            try:
-                                consultores.pop(idx)
-                                salvar_consultores(consultores)
-                                for equipe in equipes:
-                                    if c["consultor"] in equipe["consultores"]:
-                                        equipe["consultores"].remove(c["consultor"])
-                                salvar_equipes(equipes)
-                                st.success("Consultor excluído!")
-                                try:
-                                    st.rerun()
-                                except AttributeError:
-                                    st.warning("Não foi possível recarregar a página automaticamente. Atualize manualmente.")
-                            except Exception as e:
-                                st.error(f"Erro ao excluir consultor: {e}")
+                    st.error(f"Erro ao editar consultores: {e}")
         else:
             st.info("Nenhum consultor cadastrado ainda.")
 
 
     st.markdown("---")
     with st.expander("Gerenciar Equipes", expanded=False):
-        equipes = carregar_equipes()
+        nomes_equipes = {eq["nome"] for eq in equipes}
         with st.form("add_equipe_form"):
             nome_equipe = st.text_input("Nome da equipe")
             submitted_equipe = st.form_submit_button("Adicionar equipe")
             if submitted_equipe and nome_equipe:
                 try:
-                    if not any(eq["nome"] == nome_equipe for eq in equipes):
+                    if nome_equipe not in nomes_equipes:
                         equipes.append({"nome": nome_equipe, "consultores": []})
+                        nomes_equipes.add(nome_equipe)
                         salvar_equipes(equipes)
                         st.success(f"Equipe '{nome_equipe}' adicionada!")
-                        try:
-                            st.rerun()
-                        except AttributeError:
-                            st.warning("Não foi possível recarregar a página automaticamente. Atualize manualmente.")
+                        _rerun_fn()
                     else:
                         st.warning("Já existe uma equipe com esse nome.")
                 except Exception as e:
                     st.error(f"Erro ao adicionar equipe: {e}")
 
+        # dict.fromkeys: remove nomes repetidos mantendo a ordem (o multiselect exige opções únicas)
+        consultores_nomes = list(dict.fromkeys(c["consultor"] for c in consultores))
+        consultores_cadastrados = set(consultores_nomes)
         for idx, equipe in enumerate(equipes):
             st.subheader(f"Equipe: {equipe['nome']}")
-            consultores_nomes = [c["consultor"] for c in consultores]
-            consultores_na_equipe = equipe["consultores"]
-            consultores_disponiveis = [c for c in consultores_nomes if c not in consultores_na_equipe]
-            add_col, del_col, edit_col = st.columns([4,2,2])
-            with add_col:
-                novo_consultor = st.selectbox(f"Adicionar consultor à {equipe['nome']}", ["-- Selecione --"] + consultores_disponiveis, key=f"add_consultor_{idx}")
-                if novo_consultor != "-- Selecione --" and st.button(f"Adicionar à {equipe['nome']}", key=f"btn_add_consultor_{idx}"):
-                    try:
-                        equipe["consultores"].append(novo_consultor)
-                        salvar_equipes(equipes)
-                        st.success(f"Consultor '{novo_consultor}' adicionado à equipe '{equipe['nome']}'!")
+            membros_atuais = list(dict.fromkeys(equipe["consultores"]))
+            # Membros que não estão mais cadastrados continuam selecionáveis para poderem ser removidos
+            opcoes = consultores_nomes + [n for n in membros_atuais if n not in consultores_cadastrados]
+            membros_col, del_col, edit_col = st.columns([4,2,2])
+            with membros_col:
+                # Adições e remoções ficam pendentes no form e são gravadas uma única vez no submit
+                with st.form(f"form_membros_{idx}", border=False):
+                    selecionados = st.multiselect("Consultores na equipe", opcoes, default=membros_atuais, key=f"members_{idx}")
+                    submitted_membros = st.form_submit_button("Salvar membros")
+                if submitted_membros:
+                    if set(selecionados) == set(membros_atuais):
+                        st.info("Nenhuma alteração nos membros.")
+                    else:
                         try:
-                            st.rerun()
-                        except AttributeError:
-                            st.warning("Não foi possível recarregar a página automaticamente. Atualize manualmente.")
-                    except Exception as e:
-                        st.error(f"Erro ao adicionar consultor à equipe: {e}")
+                            equipe["consultores"] = selecionados
+                            salvar_equipes(equipes)
+                            st.success(f"Membros da equipe '{equipe['nome']}' atualizados!")
+                            _rerun_fn()
+                        except Exception as e:
+                            st.error(f"Erro ao atualizar consultores da equipe: {e}")
             with del_col:
                 if st.button(f"Excluir equipe", key=f"delete_equipe_{idx}"):
                     try:
                         equipes.pop(idx)
                         salvar_equipes(equipes)
                         st.success("Equipe excluída!")
-                        try:
-                            st.rerun()
-                        except AttributeError:
-                            st.warning("Não foi possível recarregar a página automaticamente. Atualize manualmente.")
+                        _rerun_fn()
                     except Exception as e:
                         st.error(f"Erro ao excluir equipe: {e}")
             with edit_col:
                 if st.button(f"Renomear equipe", key=f"rename_equipe_{idx}"):
                     st.session_state["edit_equipe_idx"] = idx
                     st.session_state["edit_equipe_nome"] = equipe["nome"]
-            st.write("**Consultores na equipe:**")
-            for cidx, nome_c in enumerate(equipe["consultores"]):
-                ccol1, ccol2 = st.columns([6,2])
-                with ccol1:
-                    st.write(f"- {nome_c}")
-                with ccol2:
-                    if st.button(f"Remover", key=f"remover_{idx}_{cidx}"):
-                        try:
-                            equipe["consultores"].remove(nome_c)
-                            salvar_equipes(equipes)
-                            st.success(f"Consultor '{nome_c}' removido da equipe '{equipe['nome']}'!")
-                            try:
-                                st.rerun()
-                            except AttributeError:
-                                st.warning("Não foi possível recarregar a página automaticamente. Atualize manualmente.")
-                        except Exception as e:
-                            st.error(f"Erro ao remover consultor da equipe: {e}")
             if "edit_equipe_idx" in st.session_state and st.session_state["edit_equipe_idx"] == idx:
                 with st.form(f"form_rename_equipe_{idx}"):
                     novo_nome = st.text_input("Novo nome da equipe", value=st.session_state["edit_equipe_nome"])
@@ -2563,91 +2420,97 @@ def aba_gerenciar_consultores():
                             st.success("Nome da equipe atualizado!")
                             del st.session_state["edit_equipe_idx"]
                             del st.session_state["edit_equipe_nome"]
-                            st.experimental_rerun()
+                            _rerun_fn()
                         except Exception as e:
                             st.error(f"Erro ao renomear equipe: {e}")
 
 
 
+_HEADER_HTML = """
+<div style='display:flex;align-items:center;gap:12px'>
+  <div style='width:44px;height:44px;border-radius:8px;background:#4B8BBE;display:flex;align-items:center;justify-content:center;color:#fff;font-weight:700'>A</div>
+  <div>
+    <div style='font-size:20px;font-weight:600;color:#e6eef8'>Automação de Listas</div>
+    <div style='font-size:12px;color:#94a3b8'>Minimal · elegante · eficiente</div>
+  </div>
+</div>
+"""
+
+# Tema escuro global (apenas visual)
+_GLOBAL_CSS = """
+<style>
+  /* Hide default bits */
+  #MainMenu {visibility: hidden;}
+  footer {visibility: hidden;}
+
+  /* App background and text */
+  [data-testid="stAppViewContainer"] {
+    background: linear-gradient(180deg,#071226 0%, #07122a 100%);
+    color: #e6eef8;
+  }
+
+  /* Sidebar styling */
+  section[data-testid="stSidebar"] {
+    background: linear-gradient(180deg,#061224 0%, #071226 100%);
+    border-right: 1px solid rgba(255,255,255,0.03);
+    padding-top: 10px;
+  }
+  section[data-testid="stSidebar"] .css-1d391kg, section[data-testid="stSidebar"] .css-1lcbmhc {
+    color: #cbd5e1;
+  }
+
+  /* Option menu overrides (streamlit_option_menu classes) */
+  .option-menu { background: transparent !important; }
+  .option-menu .nav-link { color: #cbd5e1 !important; }
+  .option-menu .nav-link:hover { background: rgba(255,255,255,0.02) !important; }
+  .option-menu .nav-link-selected { background: #12324a !important; color: #e6eef8 !important; font-weight:600 !important; box-shadow: 0 6px 18px rgba(12,44,66,0.35) !important; }
+
+  /* Info / Alert boxes look like glass cards */
+  .stAlert, .css-1tq5r2k { background: rgba(255,255,255,0.02) !important; border: 1px solid rgba(255,255,255,0.03) !important; color: #dbeafe !important; border-radius: 10px !important; padding: 10px 14px !important; }
+
+  /* File uploader and input controls */
+  .stFileUploader, .css-1hynsf2, .css-1y4p8pa { background: rgba(255,255,255,0.02) !important; border: 1px solid rgba(255,255,255,0.03) !important; border-radius: 10px !important; padding: 12px !important; }
+
+  /* Buttons */
+  .stButton>button {
+    background: linear-gradient(90deg,#4B8BBE,#3B82F6) !important;
+    color:#fff !important;
+    border-radius:8px !important;
+    padding:8px 14px !important;
+    border: none !important;
+    box-shadow: 0 6px 18px rgba(59,130,246,0.12) !important;
+  }
+  .stButton>button:hover { transform: translateY(-1px); }
+
+  /* Dataframe / tables */
+  [data-testid="stDataFrame"] { background: rgba(255,255,255,0.02); border-radius:8px; padding:8px; }
+
+  /* Muted text */
+  .muted, small { color:#94a3b8; }
+
+  /* Headings */
+  .css-2trqyj h1, .css-2trqyj h2, h1, h2, h3 { color:#e6eef8; font-weight:600; }
+
+  /* Make controls slightly higher contrast */
+  .stSelectbox > div[role="combobox"] { background: rgba(255,255,255,0.01) !important; border-radius:8px !important; padding:6px 8px !important; }
+</style>
+"""
+
+@st.cache_resource
+def _chrome():
+    """Cabeçalho + CSS global num único bloco, montado uma vez por processo.
+
+    Precisa ser emitido em todo rerun: o Streamlit remove elementos não reenviados,
+    então um guard por sessão faria o tema sumir após o primeiro clique.
+    """
+    return _HEADER_HTML + "\n" + _GLOBAL_CSS
+
+
 def main():
     st.set_page_config(page_title="Automação de Listas", layout="wide")
 
-    # Header (minimal)
-    st.markdown(
-        """
-        <div style='display:flex;align-items:center;gap:12px'>
-          <div style='width:44px;height:44px;border-radius:8px;background:#4B8BBE;display:flex;align-items:center;justify-content:center;color:#fff;font-weight:700'>A</div>
-          <div>
-            <div style='font-size:20px;font-weight:600;color:#e6eef8'>Automação de Listas</div>
-            <div style='font-size:12px;color:#94a3b8'>Minimal · elegante · eficiente</div>
-          </div>
-        </div>
-        """,
-        unsafe_allow_html=True,
-    )
-
-    # Global dark theme CSS (visual only)
-    st.markdown(
-        """
-        <style>
-          /* Hide default bits */
-          #MainMenu {visibility: hidden;}
-          footer {visibility: hidden;}
-
-          /* App background and text */
-          [data-testid="stAppViewContainer"] {
-            background: linear-gradient(180deg,#071226 0%, #07122a 100%);
-            color: #e6eef8;
-          }
-
-          /* Sidebar styling */
-          section[data-testid="stSidebar"] {
-            background: linear-gradient(180deg,#061224 0%, #071226 100%);
-            border-right: 1px solid rgba(255,255,255,0.03);
-            padding-top: 10px;
-          }
-          section[data-testid="stSidebar"] .css-1d391kg, section[data-testid="stSidebar"] .css-1lcbmhc {
-            color: #cbd5e1;
-          }
-
-          /* Option menu overrides (streamlit_option_menu classes) */
-          .option-menu { background: transparent !important; }
-          .option-menu .nav-link { color: #cbd5e1 !important; }
-          .option-menu .nav-link:hover { background: rgba(255,255,255,0.02) !important; }
-          .option-menu .nav-link-selected { background: #12324a !important; color: #e6eef8 !important; font-weight:600 !important; box-shadow: 0 6px 18px rgba(12,44,66,0.35) !important; }
-
-          /* Info / Alert boxes look like glass cards */
-          .stAlert, .css-1tq5r2k { background: rgba(255,255,255,0.02) !important; border: 1px solid rgba(255,255,255,0.03) !important; color: #dbeafe !important; border-radius: 10px !important; padding: 10px 14px !important; }
-
-          /* File uploader and input controls */
-          .stFileUploader, .css-1hynsf2, .css-1y4p8pa { background: rgba(255,255,255,0.02) !important; border: 1px solid rgba(255,255,255,0.03) !important; border-radius: 10px !important; padding: 12px !important; }
-
-          /* Buttons */
-          .stButton>button {
-            background: linear-gradient(90deg,#4B8BBE,#3B82F6) !important;
-            color:#fff !important;
-            border-radius:8px !important;
-            padding:8px 14px !important;
-            border: none !important;
-            box-shadow: 0 6px 18px rgba(59,130,246,0.12) !important;
-          }
-          .stButton>button:hover { transform: translateY(-1px); }
-
-          /* Dataframe / tables */
-          [data-testid="stDataFrame"] { background: rgba(255,255,255,0.02); border-radius:8px; padding:8px; }
-
-          /* Muted text */
-          .muted, small { color:#94a3b8; }
-
-          /* Headings */
-          .css-2trqyj h1, .css-2trqyj h2, h1, h2, h3 { color:#e6eef8; font-weight:600; }
-
-          /* Make controls slightly higher contrast */
-          .stSelectbox > div[role="combobox"] { background: rgba(255,255,255,0.01) !important; border-radius:8px !important; padding:6px 8px !important; }
-        </style>
-        """,
-        unsafe_allow_html=True,
-    )
+    # Header (minimal) + tema escuro global
+    st.markdown(_chrome(), unsafe_allow_html=True)
 
     # Sidebar navigation
     if "sidebar_open" not in st.session_state:
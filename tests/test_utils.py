@@ -1,11 +1,19 @@
+import ast
+import collections
 import sys
 import os
 import pytest
+from datetime import date
 
 # Ensure project root is on sys.path so tests can import modules from repository
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from report_generator import clean_phone_number, normalize_cep, best_match_column
+import numpy as np
+import pandas as pd
+
+from report_generator import clean_phone_number, clean_phone_series, normalize_cep, normalize_cep_series, best_match_column, generate_excel_buffer, process_agendor_report, proximo_dia_util, propagar_nomes_equipes, nomes_editados_do_editor
+import utils
+from utils import format_phone_for_whatsapp_business, format_phone_whatsapp_series, format_phone_whatsapp_series_dedup, CandidateMatcher
 
 
 def test_clean_phone_number_basic():
@@ -20,12 +28,63 @@ def test_clean_phone_number_basic():
     assert clean_phone_number("(67) 99123-4567", preserve_full=True).endswith('991234567') or len(clean_phone_number("(67) 99123-4567", preserve_full=True)) >= 10
 
 
+def test_clean_phone_series_matches_scalar():
+    values = ["(67) 9 9123-4567", "5567991234567", "67981783902.0", 67981783902.0, "5.51199E+12", "123", "", None]
+    for preserve_full in (False, True):
+        result = clean_phone_series(pd.Series(values), preserve_full=preserve_full).tolist()
+        expected = [clean_phone_number(v, preserve_full=preserve_full) for v in values]
+        assert [r if r == r else None for r in result] == [e if e == e else None for e in expected]
+
+
+def test_format_phone_whatsapp_series_matches_scalar():
+    values = ["(67) 9 9123-4567", "5567991234567", "67981783902.0", "123456789.0", "99999999999999", "123", "", None]
+    for include in (True, False):
+        numeros, status = format_phone_whatsapp_series(pd.Series(values), include_country_code=include)
+        expected = [format_phone_for_whatsapp_business(v, include_country_code=include) for v in values]
+        assert list(zip(numeros, status)) == expected
+
+
+def test_format_phone_whatsapp_series_dedup_matches_series():
+    # Repetidos e nulos (None/NaN viram o código -1 do factorize)
+    values = ["(67) 9 9123-4567", None, "5567991234567", "(67) 9 9123-4567", float("nan"),
+              "123", "", "67981783902.0", None, "5567991234567", "99999999999999"]
+    serie = pd.Series(values, index=range(100, 100 + len(values)))
+    for include in (True, False):
+        numeros, status = format_phone_whatsapp_series_dedup(serie, include_country_code=include)
+        esp_numeros, esp_status = format_phone_whatsapp_series(serie, include_country_code=include)
+        pd.testing.assert_series_equal(numeros, esp_numeros)
+        pd.testing.assert_series_equal(status, esp_status)
+
+
+def test_series_helpers_keep_non_ascii_digits_like_scalar():
+    # Dígitos fullwidth/arábico-índicos e sobrescritos: isdigit() no escalar, fora do \d do Arrow
+    values = ["(６７) ９９１２３-４５６７", "٦٧٩٩١٢٣٤٥٦٧", "７９.８００-０００", "São Paulo 79800-000",
+              "6799123456²", "79.800-00²", None]
+    result = clean_phone_series(pd.Series(values)).tolist()
+    expected = [clean_phone_number(v) for v in values]
+    assert result[:2] == expected[:2] == ["６７９９１２３４５６７", "٦٧٩٩١٢٣٤٥٦٧"]
+    assert [r if r == r else None for r in result] == [e if e == e else None for e in expected]
+    assert normalize_cep_series(pd.Series(values)).tolist() == [normalize_cep(v) for v in values]
+    # Mesmo critério do str.isdigit original: '²' conta como dígito
+    assert clean_phone_number("6799123456²") == "6799123456²"
+    assert normalize_cep("79.800-00²") == "7980000²"
+    assert format_phone_for_whatsapp_business("556799123456²") == ("+556799123456²", "OK")
+    numeros, status = format_phone_whatsapp_series(pd.Series(["556799123456²", "6799123456²"]))
+    assert list(zip(numeros, status)) == [format_phone_for_whatsapp_business(v) for v in ["556799123456²", "6799123456²"]]
+
+
 def test_normalize_cep():
     assert normalize_cep("79.800-000") == '79800000'
     assert normalize_cep("79800000") == '79800000'
     assert normalize_cep("") == ""
 
 
+def test_normalize_cep_series_matches_scalar():
+    values = ["79.800-000", "79800000", 79800000, 79800000.0, "0079800000", "123", " ", "", None]
+    result = normalize_cep_series(pd.Series(values)).tolist()
+    assert result == [normalize_cep(v) for v in values]
+
+
 def test_best_match_column():
     cols = ["Nome Completo", "Telefone Principal", "WhatsApp", "Endereco"]
     # candidate list containing possible names
@@ -35,3 +94,142 @@ def test_best_match_column():
     # whatsapp detection
     bestw = best_match_column(cols, ["Whats", "WhatsApp", "Telefone"])
     assert bestw.lower().startswith('wh') or 'telefone' in bestw.lower() or bestw in cols
+
+
+@pytest.mark.parametrize("dia, esperado", [
+    (date(2024, 1, 1), date(2024, 1, 2)),  # segunda → terça
+    (date(2024, 1, 2), date(2024, 1, 3)),  # terça → quarta
+    (date(2024, 1, 3), date(2024, 1, 4)),  # quarta → quinta
+    (date(2024, 1, 4), date(2024, 1, 5)),  # quinta → sexta
+    (date(2024, 1, 5), date(2024, 1, 8)),  # sexta → segunda
+    (date(2024, 1, 6), date(2024, 1, 8)),  # sábado → segunda
+    (date(2024, 1, 7), date(2024, 1, 8)),  # domingo → segunda
+])
+def test_proximo_dia_util_each_weekday(dia, esperado):
+    assert proximo_dia_util(dia) == esperado
+
+
+def test_candidate_matcher_reuse_matches_best_match_column():
+    candidates = ["Whats", "WhatsApp", "Celular", "Telefone"]
+    matcher = CandidateMatcher(candidates)
+    for cols in (["Nome", "Whatsapp do Cliente", "CEP"], ["Fone", "Celular 1", "xyz"], ["Qqq", "Zzz"]):
+        assert matcher.match(cols) == best_match_column(cols, candidates)
+
+
+def test_generate_excel_buffer_multiple_chunks_same_sheet():
+    df_a = pd.DataFrame({"Nome": ["A", "B"], "WhatsApp": ["1", "2"]})
+    # Colunas em outra ordem e uma coluna extra: segue o layout do primeiro pedaço
+    df_b = pd.DataFrame({"MOTIVO_ERRO": ["x"], "WhatsApp": ["3"], "Nome": ["C"]})
+    buf = generate_excel_buffer([df_a, df_b], sheet_name='Pessoas')
+    result = pd.read_excel(buf, sheet_name='Pessoas', dtype=str)
+    assert list(result.columns) == ["Nome", "WhatsApp"]
+    assert result["Nome"].tolist() == ["A", "B", "C"]
+    assert result["WhatsApp"].tolist() == ["1", "2", "3"]
+
+
+@pytest.mark.parametrize("engine", ["xlsxwriter", "openpyxl"])
+def test_gerar_excel_em_memoria_fast_matches_generate_excel_buffer(monkeypatch, engine):
+    df = pd.DataFrame({
+        "Nome": ["Ana", None, "Caio"],
+        "Valor": [1.5, np.nan, 3.0],
+        "Qtd": [1, 2, 3],
+        "Data": pd.to_datetime(["2024-01-05 00:00", None, "2024-01-08 10:30"]),
+        "Link": ["https://wa.me/5567991234567", "www.exemplo.com.br", "mailto:a@b.com"],
+    })
+    esperado = pd.read_excel(generate_excel_buffer(df, sheet_name="Lote"), sheet_name="Lote")
+
+    monkeypatch.setattr(utils, "_EXCEL_ENGINE", engine)
+
+    # Sem o fallback do pandas: garante que foi a escrita linha a linha que gerou o arquivo
+    def _sem_fallback(output):
+        raise AssertionError("fallback para o pandas")
+    monkeypatch.setattr(utils, "_excel_writer", _sem_fallback)
+
+    buf = utils.gerar_excel_em_memoria_fast(df, sheet_name="Lote")
+    result = pd.read_excel(buf, sheet_name="Lote")
+    pd.testing.assert_frame_equal(result, esperado)
+    assert result["Link"].tolist() == df["Link"].tolist()
+
+
+def test_generate_excel_buffers_parallel_pool_matches_serial(monkeypatch):
+    dfs = [
+        pd.DataFrame({"Nome": [f"N{i}-{j}" for j in range(5)], "Qtd": range(5), "Valor": [1.5, np.nan, 2, 3, 4]})
+        for i in range(3)
+    ]
+    serial = [pd.read_excel(b) for b in utils.generate_excel_buffers_parallel(dfs)]
+
+    # min_rows=0 força o pool (spawn); sem o fallback, uma falha nos workers aparece aqui
+    monkeypatch.setattr(utils.os, "cpu_count", lambda: 2)
+    def _sem_fallback(*args, **kwargs):
+        raise AssertionError("fallback sequencial")
+    monkeypatch.setattr(utils, "generate_excel_buffer", _sem_fallback)
+
+    paralelo = [pd.read_excel(b) for b in utils.generate_excel_buffers_parallel(dfs, min_rows=0)]
+    assert len(paralelo) == len(serial)
+    for esperado, result in zip(serial, paralelo):
+        pd.testing.assert_frame_equal(result, esperado)
+
+
+def test_no_duplicate_top_level_functions():
+    # Uma segunda definição com o mesmo nome sobrescreve a primeira silenciosamente
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    for module in ("utils.py", "report_generator.py"):
+        with open(os.path.join(root, module), encoding="utf-8") as f:
+            tree = ast.parse(f.read())
+        names = collections.Counter(n.name for n in tree.body if isinstance(n, ast.FunctionDef))
+        assert [name for name, count in names.items() if count > 1] == [], module
+
+
+def test_process_agendor_report_splits_duplicates_and_manual_fixes():
+    df_original = pd.DataFrame({
+        "Nome": ["Ana", "Bruno", "Carla"],
+        "WhatsApp": ["(67) 99123-4567", "67 98888-7777", "67 97777-6666"],
+    })
+    df_error = pd.DataFrame({
+        "WhatsApp": ["5567991234567", "67988887777"],
+        "Motivo": ["Duplicidade de cadastro", "Telefone inválido"],
+    })
+    df_safe, df_manual_fix, stats = process_agendor_report(df_original, df_error)
+    assert df_safe["Nome"].tolist() == ["Carla"]
+    assert df_manual_fix["Nome"].tolist() == ["Bruno"]
+    assert df_manual_fix["MOTIVO_ERRO"].tolist() == ["Telefone inválido"]
+    assert stats["safe_total"] == 1 and stats["manual_fix_needed"] == 1
+
+
+def test_propagar_nomes_equipes_nome_repetido():
+    # Duas linhas com o mesmo nome excluídas/renomeadas no mesmo submit não devem falhar.
+    consultores = [
+        {"usuario": "ana1", "consultor": "Ana"},
+        {"usuario": "ana2", "consultor": "Ana"},
+        {"usuario": "bia", "consultor": "Bia"},
+    ]
+    equipes = [{"nome": "E1", "consultores": ["Ana", "Bia"]}, {"nome": "E2", "consultores": ["Bia"]}]
+    assert propagar_nomes_equipes(consultores, {1: "Carla", 2: "Bia"}, equipes)
+    assert equipes[0]["consultores"] == ["Bia"]
+    assert equipes[1]["consultores"] == ["Bia"]
+
+    equipes = [{"nome": "E1", "consultores": ["Ana"]}]
+    assert propagar_nomes_equipes(consultores, {2: "Bia"}, equipes)
+    assert equipes[0]["consultores"] == []
+    assert not propagar_nomes_equipes(consultores, {0: "Ana", 1: "Ana", 2: "Bia"}, equipes)
+
+
+def test_nomes_editados_do_editor_excluir_ultimo_e_adicionar():
+    # O Streamlit dá à linha nova o índice que a excluída liberou: não é renomeação
+    consultores = [
+        {"usuario": "ana", "consultor": "Ana"},
+        {"usuario": "bia", "consultor": "Bia"},
+        {"usuario": "caio", "consultor": "Caio"},
+    ]
+    estado = {
+        "deleted_rows": [2],
+        "edited_rows": {0: {"consultor": "Ana Paula "}},
+        "added_rows": [{"usuario": "davi", "consultor": "Davi"}],
+    }
+    nomes = nomes_editados_do_editor(consultores, estado)
+    assert nomes == {0: "Ana Paula", 1: "Bia"}
+
+    equipes = [{"nome": "E", "consultores": ["Caio"]}, {"nome": "F", "consultores": ["Ana"]}]
+    assert propagar_nomes_equipes(consultores, nomes, equipes)
+    assert equipes[0]["consultores"] == []
+    assert equipes[1]["consultores"] == ["Ana Paula"]
@@ -1,170 +1,130 @@
 import io
+import os
+import re
+import collections
 import difflib
+import functools
 import pandas as pd
 import numpy as np
 from datetime import timedelta
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
 
+try:
+    import pyarrow as pa  # noqa: F401  strings em buffers Arrow: .str.* roda em C++ e ocupa menos memória
+    _STRING_DTYPE = "string[pyarrow]"
+except ImportError:
+    pa = None
+    _STRING_DTYPE = "string"
 
-def clean_phone_number(number_str, preserve_full=False):
-    """Limpa e valida um número de telefone.
 
-    Args:
-        number_str: valor original (string/num).
-        preserve_full: quando True, NÃO faz o corte final de últimos 10/11 dígitos
-                       e em vez disso retorna todos os dígitos se houver ao menos 10.
+class _TabelaSoDigitos(dict):
+    """Tabela de `str.translate` que apaga tudo que não é dígito (mesmo critério de `str.isdigit`).
 
-    Retorna NaN quando inválido.
+    Preenchida sob demanda: cada caractere é classificado uma vez e fica em cache.
     """
-    if pd.isna(number_str) or str(number_str).strip() == '':
-        return np.nan
-    digits = ''.join(filter(str.isdigit, str(number_str)))
 
-    if preserve_full:
-        if len(digits) >= 10:
-            return digits
-        return np.nan
+    def __missing__(self, codigo):
+        ch = chr(codigo)
+        valor = ch if ch.isdigit() else None
+        self[codigo] = valor
+        return valor
 
-    if len(digits) >= 11:
-        return digits[-11:]
-    if len(digits) == 10:
-        return digits[-10:]
-    return np.nan
 
+# Remove tudo que não é dígito (usado pelos normalizadores escalares); translate roda
+# em C sem o custo de despachar um regex, ~2x mais rápido em telefones/CEPs curtos
+_SO_DIGITOS = _TabelaSoDigitos()
 
-def normalize_cep(cep_str):
-    """Normaliza um CEP: remove não dígitos e retorna string com 8 dígitos ou empty string."""
-    if pd.isna(cep_str) or str(cep_str).strip() == '':
-        return ""
-    digits = ''.join(filter(str.isdigit, str(cep_str)))
-    if len(digits) == 8:
-        return digits
-    elif len(digits) > 8:
-        return digits[-8:]
-    else:
-        return ""
 
+def _strip_non_digits_series(series):
+    """Equivalente vetorizado de `_SO_DIGITOS`: só os dígitos de cada valor (nulos seguem nulos).
 
-def best_match_column(df_columns, candidates, min_score=50):
-    """Retorna a melhor coluna de `df_columns` que corresponde aos `candidates`.
-    Usa várias heurísticas combinadas (igualdade, substring, interseção de tokens e similaridade).
-    Retorna string vazia se nenhuma coluna atingir `min_score`.
+    Ponto único dos normalizadores de coluna; converte para o dtype de texto só se preciso.
     """
-    # 0. Safety: Convert to list to avoid Pandas "Ambiguous Truth" errors
-    try:
-        if hasattr(df_columns, 'tolist'):
-            cols_list = df_columns.tolist()
-        else:
-            cols_list = list(df_columns)
-    except Exception:
-        # If conversion fails, assume empty
-        return ''
-
-    if not cols_list:
-        return ''
-
-    df_cols = [str(c) for c in cols_list]
-    df_cols_lower = [c.lower() for c in df_cols]
-
-    best_col = ''
-    best_score = 0.0
-
-    for cand in candidates:
-        if not cand:
-            continue
-        cand_l = str(cand).lower()
-        cand_tokens = set([t for t in ''.join(ch if ch.isalnum() else ' ' for ch in cand_l).split() if t])
-
-        for i, col in enumerate(df_cols):
-            col_l = df_cols_lower[i]
-            score = 0.0
-
-            # Exata igualdade (maior peso)
-            if col_l == cand_l:
-                score += 120
-
-            # Substring (col contém candidato ou candidato contém coluna)
-            if cand_l in col_l or col_l in cand_l:
-                score += 80
-
-            # Token overlap
-            col_tokens = set([t for t in ''.join(ch if ch.isalnum() else ' ' for ch in col_l).split() if t])
-            if cand_tokens and col_tokens:
-                inter = cand_tokens.intersection(col_tokens)
-                union = cand_tokens.union(col_tokens)
-                if union:
-                    score += 40 * (len(inter) / len(union))
-
-            # Similaridade fuzzier via SequenceMatcher
-            try:
-                ratio = difflib.SequenceMatcher(a=cand_l, b=col_l).ratio()
-                score += 40 * ratio
-            except Exception:
-                pass
-
-            # Slight preference for shorter column names on ties
-            score -= 0.01 * len(col_l)
-
-            if score > best_score:
-                best_score = score
-                best_col = col
-
-    if best_score >= min_score:
-        return best_col
-    return ''
-
-
-def proximo_dia_util(data_obj):
-    """Retorna o próximo dia útil (pulando sábados e domingos)."""
-    try:
-        next_day = data_obj + timedelta(days=1)
-        while next_day.weekday() >= 5:
-            next_day += timedelta(days=1)
-        return next_day
-    except Exception:
-        try:
-            next_day = (pd.to_datetime(data_obj) + pd.Timedelta(days=1)).date()
-            while next_day.weekday() >= 5:
-                next_day = (pd.to_datetime(next_day) + pd.Timedelta(days=1)).date()
-            return next_day
-        except Exception:
-            return data_obj
-
-
-def determine_localidade(user_col_mapping, df_lote, default="CG"):
-    possible_uf_keys = ["UF", "Estado", "Estado/UF", "UF/Estado"]
-    for k in possible_uf_keys:
-        uf_col = user_col_mapping.get(k)
-        if uf_col and uf_col in df_lote.columns and not df_lote[uf_col].dropna().empty:
-            val = str(df_lote[uf_col].iloc[0]).strip()
-            if len(val) == 2:
-                return val.upper()
-
-    cidade_col = user_col_mapping.get("Cidade")
-    if cidade_col and cidade_col in df_lote.columns and not df_lote[cidade_col].dropna().empty:
-        val = str(df_lote[cidade_col].iloc[0]).strip()
-        if 0 < len(val) <= 3:
-            return val.upper()
-
-    return default
+    if series.dtype != _STRING_DTYPE:
+        series = series.astype(_STRING_DTYPE)
+    digits = series.str.replace(r"\D+", "", regex=True)
+    # \d do regex não cobre todo `str.isdigit` (no Arrow/RE2 só casa 0-9; no re do Python
+    # deixa de fora '²', '①'...): valores com caracteres não ASCII vão para a tabela escalar
+    nao_ascii = series.str.contains(r"[^\x00-\x7F]", regex=True).fillna(False).to_numpy(dtype=bool)
+    if nao_ascii.any():
+        digits[nao_ascii] = pd.array([v.translate(_SO_DIGITOS) for v in series[nao_ascii]], dtype=digits.dtype)
+    return digits
+
+try:
+    import xlsxwriter  # noqa: F401  opcional: escrita de .xlsx em uma passada, mais rápida que openpyxl
+    _EXCEL_ENGINE = "xlsxwriter"
+except ImportError:
+    _EXCEL_ENGINE = "openpyxl"
+
+try:
+    from rapidfuzz import fuzz as _rf_fuzz  # opcional: similaridade em C++, bem mais rápida que difflib
+    from rapidfuzz import process as _rf_process
+except ImportError:
+    _rf_fuzz = _rf_process = None
+
+
+# Classificação do telefone já limpo (só dígitos, ao menos 10) no formatador do WhatsApp.
+# Só conta caracteres: o texto já passou por `str.isdigit`, que aceita mais que o \d ('²').
+_PHONE_RE = re.compile(r'(?P<ddi>55.{10,})|(?P<local>.{10,11})')
+
+# A partir desse tamanho o DataFrame é escrito linha a linha (ver gerar_excel_em_memoria_fast).
+# PyExcelerate foi avaliado para lotes de 50k+ linhas e não compensou: mesmo tempo que o
+# xlsxwriter em constant_memory (~4 s para 100k linhas), datas saem como número serial sem
+# formato e o cabeçalho perde o estilo. Por isso não há um terceiro backend.
+_FAST_EXCEL_MIN_ROWS = 20000
+
+
+# Texto com cara de URL continua texto (como no openpyxl); sem isso o xlsxwriter cria
+# um hyperlink por célula e avisa ao passar do limite de 65.530 links por aba.
+# constant_memory não entra aqui: o pandas escreve coluna a coluna, e nesse modo o
+# xlsxwriter descarta células de linhas já gravadas (o caminho rápido o usa).
+_XLSXWRITER_OPTIONS = {'strings_to_urls': False}
+
+
+def _excel_writer(output):
+    """ExcelWriter do backend único usado por todos os geradores de planilha."""
+    if _EXCEL_ENGINE == "xlsxwriter":
+        return pd.ExcelWriter(output, engine=_EXCEL_ENGINE,
+                              engine_kwargs={'options': dict(_XLSXWRITER_OPTIONS)})
+    return pd.ExcelWriter(output, engine=_EXCEL_ENGINE)
 
 
 def generate_excel_buffer(data, **kwargs):
     """
     Gera um buffer Excel em memória.
     Args:
-        data: Pode ser um pd.DataFrame (gera uma aba) ou um dict {'NomeAba': df, ...} (gera várias abas).
+        data: Pode ser um pd.DataFrame (gera uma aba), um dict {'NomeAba': df, ...} (gera várias abas)
+              ou uma lista/tupla de DataFrames, escritos em sequência na MESMA aba (sem concatenar
+              em memória). Nesse caso o layout de colunas do primeiro DataFrame define o cabeçalho.
         kwargs: Argumentos extras passados para to_excel (ex: sheet_name se for single df).
     """
     output = io.BytesIO()
     try:
         # Se 'index' estiver em kwargs, usamos, caso contrário False
         index_arg = kwargs.pop('index', False)
-        
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
+
+        # Lotes grandes sem opções especiais: caminho rápido, sem o formatador do pandas
+        if (isinstance(data, pd.DataFrame) and len(data) >= _FAST_EXCEL_MIN_ROWS
+                and not index_arg and set(kwargs) <= {'sheet_name'}):
+            return gerar_excel_em_memoria_fast(data, **kwargs)
+
+        with _excel_writer(output) as writer:
             if isinstance(data, pd.DataFrame):
                 # Caso clássico: um único DataFrame
                 # Se sheet_name não for passado, o pandas usa 'Sheet1' por padrão
                 data.to_excel(writer, index=index_arg, **kwargs)
+            elif isinstance(data, (list, tuple)):
+                # Vários pedaços na mesma aba: cabeçalho só no primeiro, os demais logo abaixo
+                columns = None
+                startrow = 0
+                for i, df in enumerate(data):
+                    if columns is None:
+                        columns = df.columns
+                    elif not df.columns.equals(columns):
+                        df = df.reindex(columns=columns)
+                    df.to_excel(writer, index=index_arg, header=(i == 0), startrow=startrow, **kwargs)
+                    startrow += len(df) + (0 if i else 1)
             elif isinstance(data, dict):
                 # Caso novo: Dicionário de DataFrames
                 for sheet_name, df in data.items():
@@ -177,6 +137,39 @@ def generate_excel_buffer(data, **kwargs):
     except Exception:
         return io.BytesIO()
 
+# Abaixo disso subir processos custa mais que gerar as planilhas em sequência.
+# Também é o tamanho do grupo de lotes que o divisor junta antes de gerar as planilhas.
+PARALLEL_EXCEL_MIN_ROWS = 50000
+
+
+def _excel_bytes(args):
+    """Worker do pool: gera a planilha e devolve só os bytes (mais barato de serializar)."""
+    df, kwargs = args
+    return generate_excel_buffer(df, **kwargs).getvalue()
+
+
+def generate_excel_buffers_parallel(dfs, min_rows=PARALLEL_EXCEL_MIN_ROWS, **kwargs):
+    """
+    Gera um buffer Excel por DataFrame de `dfs`, na mesma ordem, repartindo entre processos.
+    Cada planilha é independente, então a serialização escala com os núcleos disponíveis.
+    Com um único lote, menos de `min_rows` linhas no total ou se o pool não puder ser
+    criado, gera em sequência.
+    """
+    dfs = list(dfs)
+    workers = min(len(dfs), os.cpu_count() or 1)
+    if workers > 1 and sum(len(df) for df in dfs) >= min_rows:
+        try:
+            # spawn: o servidor do Streamlit tem várias threads, e fork com threads pode travar
+            with ProcessPoolExecutor(max_workers=workers,
+                                     mp_context=multiprocessing.get_context("spawn")) as ex:
+                chunksize = max(1, len(dfs) // (4 * workers))
+                return [io.BytesIO(b) for b in ex.map(_excel_bytes, [(df, kwargs) for df in dfs],
+                                                      chunksize=chunksize)]
+        except Exception:
+            pass
+    return [generate_excel_buffer(df, **kwargs) for df in dfs]
+
+
 def format_phone_for_whatsapp_business(phone_str, default_country_code="+55", include_country_code=True):
     """
     Formata um número de telefone para o padrão WhatsApp Business (com DDI).
@@ -193,53 +186,92 @@ def format_phone_for_whatsapp_business(phone_str, default_country_code="+55", in
     # Limpeza básica
     cleaned = clean_phone_number(phone_str, preserve_full=True)
     if pd.isna(cleaned) or str(cleaned) == "":
-        digits = ''.join(filter(str.isdigit, str(phone_str)))
+        digits = str(phone_str).translate(_SO_DIGITOS)
         if not digits:
              return "", "VAZIO"
         cleaned = digits
 
     phone_clean = str(cleaned)
     raw_len = len(phone_clean)
-    
-    formatted_num = ""
-    status = "OK"
 
     if raw_len < 10:
         # Número curto (sem DDD) - Descartar
         return "", "VAZIO"
+
+    # Uma única classificação: "ddi" = já tem 55 + DDD + número (12+ dígitos),
+    # "local" = DDD + número (10/11 dígitos); sem match = longo demais e sem 55
+    tipo = _PHONE_RE.fullmatch(phone_clean)
+    tipo = tipo.lastgroup if tipo else None
     
     # Lógica se tiver país e quisermos remover
     if not include_country_code:
         # Se começar com 55 e tiver 12 ou 13 dígitos, remove o 55
-        if phone_clean.startswith("55") and raw_len >= 12:
-             formatted_num = phone_clean[2:]
-             status = "OK (Sem +55)"
-        else:
-             formatted_num = phone_clean
-             status = "OK (Sem +55)"
-        return formatted_num, status
+        return (phone_clean[2:] if tipo == "ddi" else phone_clean), "OK (Sem +55)"
 
     # Lógica com país (Padrão)
-    if phone_clean.startswith("55") and raw_len >= 12:
+    if tipo == "ddi":
         # Já tem DDI (55 + 2 DDD + 8/9 num = 12/13 digitos)
-        formatted_num = f"+{phone_clean}"
-        status = "OK"
-    
-    elif raw_len == 10 or raw_len == 11:
+        return f"+{phone_clean}", "OK"
+    if tipo == "local":
         # Caso padrão DDD+Num (10 ou 11 digitos)
-        formatted_num = f"{default_country_code}{phone_clean}"
-        status = "CORRIGIDO (+55)"
-        
+        return f"{default_country_code}{phone_clean}", "CORRIGIDO (+55)"
+    # Outros casos (ex: muito longo sem 55) mas com pelo menos 10 digitos: garante o +55
+    return f"{default_country_code}{phone_clean}", "INCERTO"
+
+
+def format_phone_whatsapp_series(series, default_country_code="+55", include_country_code=True):
+    """Versão vetorizada de `format_phone_for_whatsapp_business` para uma coluna inteira.
+
+    Retorna duas Series alinhadas ao índice de `series`: (numero_formatado, status_msg),
+    com as mesmas regras e os mesmos status do formatador escalar.
+    """
+    series = pd.Series(series)
+    texto = series.astype(_STRING_DTYPE)
+    vazio = (texto.isna() | texto.str.strip().eq("")).to_numpy(dtype=bool)
+
+    # Mesmo fallback do escalar: se a limpeza falhar, usa os dígitos crus
+    # (só nessas linhas; nas demais o regex já passou dentro de clean_phone_series)
+    cleaned = clean_phone_series(series, preserve_full=True)
+    falhou = cleaned.isna().to_numpy(dtype=bool)
+    phone = cleaned.astype(_STRING_DTYPE)
+    if falhou.any():
+        phone[falhou] = _strip_non_digits_series(texto[falhou]).array
+    lens = phone.str.len()
+    vazio |= ~(lens >= 10).fillna(False).to_numpy(dtype=bool)
+
+    ddi = (phone.str.startswith("55") & (lens >= 12)).fillna(False).to_numpy(dtype=bool)
+    local = lens.isin([10, 11]).to_numpy(dtype=bool)
+    phone = phone.fillna("").astype(object)
+
+    # Máscaras na mesma ordem dos ramos do escalar; o default cobre "longo demais e sem 55"
+    mascaras = [vazio, ddi, local]
+    if include_country_code:
+        com_cc = (default_country_code + phone).to_numpy()
+        numeros_ramos = ["", ("+" + phone).to_numpy(), com_cc]
+        padrao_numero, status_ramos = com_cc, ["VAZIO", "OK", "CORRIGIDO (+55)"]
+        padrao_status = "INCERTO"
     else:
-        # Outros casos (ex: muito longo sem 55) mas com pelo menos 10 digitos
-        # Tenta garantir o +55 se não tiver
-        if not phone_clean.startswith("55"):
-             formatted_num = f"{default_country_code}{phone_clean}"
-        else:
-             formatted_num = f"+{phone_clean}"
-        status = "INCERTO"
+        numeros_ramos = ["", phone.str[2:].to_numpy(), phone.to_numpy()]
+        padrao_numero, status_ramos = phone.to_numpy(), ["VAZIO", "OK (Sem +55)", "OK (Sem +55)"]
+        padrao_status = "OK (Sem +55)"
+    numero = np.select(mascaras, numeros_ramos, padrao_numero).astype(object)
+    status = np.select(mascaras, status_ramos, padrao_status).astype(object)
+    return pd.Series(numero, index=series.index), pd.Series(status, index=series.index)
 
-    return formatted_num, status
+
+def format_phone_whatsapp_series_dedup(series, **kwargs):
+    """`format_phone_whatsapp_series` formatando cada valor distinto uma única vez.
+
+    Útil em colunas com muitos números repetidos (o mesmo contato em vários lotes):
+    os valores são fatorados pelo texto e o resultado é espalhado de volta pelos códigos.
+    """
+    series = pd.Series(series)
+    codes, unicos = pd.factorize(series.astype(_STRING_DTYPE))
+    numeros, status = format_phone_whatsapp_series(pd.Series(unicos), **kwargs)
+    # Código -1 (nulo) cai na última posição: vazio
+    numeros = np.append(numeros.to_numpy(dtype=object), "")[codes]
+    status = np.append(status.to_numpy(dtype=object), "VAZIO")[codes]
+    return pd.Series(numeros, index=series.index), pd.Series(status, index=series.index)
 
 
 def clean_phone_number(number_str, preserve_full=False):
@@ -252,11 +284,16 @@ def clean_phone_number(number_str, preserve_full=False):
 
     Retorna NaN quando inválido.
     """
-    if pd.isna(number_str) or str(number_str).strip() == '':
+    # Caminho rápido para texto (o caso comum): dispensa o pd.isna, que inspeciona o tipo
+    if isinstance(number_str, str):
+        s_val = number_str.strip()
+    elif number_str is None or pd.isna(number_str):
+        return np.nan
+    else:
+        # Converte para string e remove espaços
+        s_val = str(number_str).strip()
+    if s_val == '':
         return np.nan
-    
-    # Converte para string e remove espaços
-    s_val = str(number_str).strip()
     
     # TRATAMENTO PARA NOTAÇÃO CIENTÍFICA (Ex: 5.51199E+12)
     if 'E' in s_val.upper() and '.' in s_val:
@@ -274,7 +311,7 @@ def clean_phone_number(number_str, preserve_full=False):
     if s_val.endswith('.0'):
         s_val = s_val[:-2]
         
-    digits = ''.join(filter(str.isdigit, s_val))
+    digits = s_val.translate(_SO_DIGITOS)
 
     if preserve_full:
         # Preserva o valor inteiro quando parece um telefone (>=10 dígitos)
@@ -293,11 +330,38 @@ def clean_phone_number(number_str, preserve_full=False):
     return np.nan
 
 
+def clean_phone_series(series, preserve_full=False):
+    """Versão vetorizada de `clean_phone_number` para uma coluna inteira.
+
+    Mesmas regras do escalar, mas com regex do pandas em vez de um loop Python por linha.
+    Retorna uma Series (dtype object, mesmo índice) com strings de dígitos ou NaN.
+    """
+    series = pd.Series(series)
+    s = series.astype(_STRING_DTYPE).str.strip()
+
+    # Notação científica (ex: 5.51199E+12) é rara: delega essas linhas ao caminho escalar
+    sci = (s.str.upper().str.contains("E", regex=False) & s.str.contains(".", regex=False)).fillna(False)
+
+    digits = _strip_non_digits_series(s.str.replace(r"\.0$", "", regex=True))
+    lens = digits.str.len()
+    if preserve_full:
+        result = digits.where(lens >= 10)
+    else:
+        # >= 11 dígitos: últimos 11 (DDD + móvel); exatamente 10: mantém (fixo/antigo)
+        result = digits.str[-11:].where(lens >= 10)
+
+    result = result.astype(object).where(result.notna(), np.nan)
+    if sci.any():
+        result[sci] = series[sci].map(lambda v: clean_phone_number(v, preserve_full=preserve_full))
+    return result
+
+
 def normalize_cep(cep_str):
+
     """Normaliza um CEP: remove não dígitos e retorna string com 8 dígitos ou empty string."""
     if pd.isna(cep_str) or str(cep_str).strip() == '':
         return ""
-    digits = ''.join(filter(str.isdigit, str(cep_str)))
+    digits = str(cep_str).translate(_SO_DIGITOS)
     if len(digits) == 8:
         # Retorna apenas os 8 dígitos (sem traço)
         return digits
@@ -310,83 +374,246 @@ def normalize_cep(cep_str):
         return ""
 
 
+def normalize_cep_series(series):
+    """Versão vetorizada de `normalize_cep` para uma coluna inteira.
+
+    Retorna uma Series (dtype object, mesmo índice) com os 8 dígitos ou "" quando inválido.
+    """
+    series = pd.Series(series)
+    digits = _strip_non_digits_series(series)
+    # Mais de 8 dígitos: os 8 últimos (possível prefixo extra); menos: inválido
+    result = digits.str[-8:].where(digits.str.len() >= 8, "")
+    return result.fillna("").astype(object)
+
+
+def _mapas_caracteres(textos):
+    """Um bitmap de 64 bits por texto marcando os caracteres presentes (por ord % 64).
+
+    Sem nenhum bit em comum, duas strings não compartilham caractere algum e a
+    similaridade fuzzy é exatamente 0. Colisões só geram falsos "em comum", nunca o
+    contrário, então o atalho é exato.
+    """
+    mapas = []
+    for texto in textos:
+        m = 0
+        for ch in set(texto):
+            m |= 1 << (ord(ch) & 63)
+        mapas.append(m)
+    return np.array(mapas, dtype=np.uint64)
+
+
+class ColumnIndex:
+    """Colunas de um DataFrame já normalizadas e tokenizadas para `best_match_column`.
+
+    Monte uma vez por DataFrame e reaproveite em várias buscas sobre as mesmas colunas.
+    """
+    __slots__ = ("cols", "lower", "tokens", "bitmaps")
+
+    def __init__(self, columns):
+        self.cols = tuple(str(c) for c in columns)
+        self.lower = tuple(c.lower() for c in self.cols)
+        self.tokens = tuple(_tokens(c) for c in self.lower)
+        self.bitmaps = _mapas_caracteres(self.lower)
+
+    def __len__(self):
+        return len(self.cols)
+
+    def __eq__(self, other):
+        return isinstance(other, ColumnIndex) and self.cols == other.cols
+
+    def __hash__(self):
+        return hash(self.cols)
+
+
+@functools.lru_cache(maxsize=256)
+def _column_index(cols):
+    return ColumnIndex(cols)
+
+
 def best_match_column(df_columns, candidates, min_score=50):
     """Retorna a melhor coluna de `df_columns` que corresponde aos `candidates`.
     Usa várias heurísticas combinadas (igualdade, substring, interseção de tokens e similaridade).
+    `df_columns` pode ser uma lista de nomes ou um `ColumnIndex` já montado.
     Retorna string vazia se nenhuma coluna atingir `min_score`.
     """
+    if not isinstance(df_columns, ColumnIndex):
+        if not df_columns:
+            return ''
+        # Tuplas tornam a chamada memoizável: o mesmo arquivo costuma ser consultado várias vezes
+        df_columns = _column_index(tuple(str(c) for c in df_columns))
     if not df_columns:
         return ''
+    return _best_match_column_cached(df_columns, tuple(candidates), min_score)
 
-    df_cols = [str(c) for c in df_columns]
-    df_cols_lower = [c.lower() for c in df_cols]
 
-    best_col = ''
-    best_score = 0.0
+# Acima disso o SequenceMatcher fica caro (pior caso quadrático); usa-se uma aproximação linear
+_MAX_LEN_SEQUENCE_MATCHER = 64
 
-    for cand in candidates:
-        if not cand:
-            continue
-        cand_l = str(cand).lower()
-        cand_tokens = set([t for t in ''.join(ch if ch.isalnum() else ' ' for ch in cand_l).split() if t])
 
-        for i, col in enumerate(df_cols):
-            col_l = df_cols_lower[i]
-            score = 0.0
+@functools.lru_cache(maxsize=4096)
+def _similaridade(a, b):
+    """Similaridade 0..1 entre duas strings (RapidFuzz quando instalado, senão difflib).
+
+    Memoizada: os mesmos pares cabeçalho x candidato se repetem a cada planilha.
+    A ordem dos argumentos não é normalizada porque o SequenceMatcher não é simétrico.
+    """
+    if _rf_fuzz is not None:
+        return _rf_fuzz.ratio(a, b) / 100.0
+    if max(len(a), len(b)) <= _MAX_LEN_SEQUENCE_MATCHER:
+        # autojunk=False: nomes de coluna não têm "lixo", e a heurística só distorce o resultado
+        return difflib.SequenceMatcher(None, a, b, autojunk=False).ratio()
+    # Cabeçalhos muito longos (texto livre): caracteres em comum, como o quick_ratio do difflib
+    comuns = sum((collections.Counter(a) & collections.Counter(b)).values())
+    return 2.0 * comuns / (len(a) + len(b))
+
 
-            # Exata igualdade (maior peso)
-            if col_l == cand_l:
-                score += 120
+# Sequências alfanuméricas (inclui acentos; '_' separa como antes)
+_TOKEN_RE = re.compile(r'[^\W_]+')
 
-            # Substring (col contém candidato ou candidato contém coluna)
-            if cand_l in col_l or col_l in cand_l:
-                score += 80
 
-            # Token overlap
-            col_tokens = set([t for t in ''.join(ch if ch.isalnum() else ' ' for ch in col_l).split() if t])
-            if cand_tokens and col_tokens:
-                inter = cand_tokens.intersection(col_tokens)
-                union = cand_tokens.union(col_tokens)
-                if union:
-                    score += 40 * (len(inter) / len(union))
+@functools.lru_cache(maxsize=1024)
+def _tokens(text):
+    # frozenset: o resultado fica no cache e é compartilhado entre chamadas
+    return frozenset(_TOKEN_RE.findall(text))
+
+
+def _matriz_similaridade(cands, cols, pendente):
+    """Matriz candidato x coluna de similaridade 0..1, calculada só onde `pendente`.
+
+    Com RapidFuzz é uma única chamada cdist (mais barata que escolher pares);
+    no fallback difflib os pares descartados não são comparados.
+    """
+    if _rf_process is not None:
+        return _rf_process.cdist(cands, cols, scorer=_rf_fuzz.ratio, dtype=np.float64) / 100.0
+    sim = np.zeros(pendente.shape, dtype=np.float64)
+    for i, j in zip(*np.nonzero(pendente)):
+        sim[i, j] = _similaridade(cands[i], cols[j])
+    return sim
+
+
+def _matriz_jaccard(cand_tokens, col_tokens):
+    """Matriz candidato x coluna de Jaccard entre conjuntos de tokens (0 se algum for vazio).
+
+    Cada lado vira uma matriz de incidência token a token; |∩| sai de um único produto
+    matricial e |∪| = |a| + |b| - |∩|, sem montar um conjunto por par.
+    """
+    vocab = {}
+    for tokens in (*cand_tokens, *col_tokens):
+        for t in tokens:
+            vocab.setdefault(t, len(vocab))
+
+    def incidencia(lista):
+        m = np.zeros((len(lista), len(vocab)), dtype=np.float64)
+        for i, tokens in enumerate(lista):
+            m[i, [vocab[t] for t in tokens]] = 1.0
+        return m
+
+    a, b = incidencia(cand_tokens), incidencia(col_tokens)
+    inter = a @ b.T
+    tam_a, tam_b = a.sum(axis=1)[:, None], b.sum(axis=1)[None, :]
+    uniao = tam_a + tam_b - inter
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where((tam_a > 0) & (tam_b > 0), inter / uniao, 0.0)
+
+
+class CandidateMatcher:
+    """Lista de candidatos pré-processada para `best_match_column`.
+
+    Normaliza, tokeniza e monta o bitmap de caracteres dos candidatos uma única vez;
+    guarde a instância para casar o mesmo vocabulário com várias planilhas.
+    """
+
+    def __init__(self, candidates, min_score=50):
+        self.min_score = min_score
+        self._lowered = [str(cand).lower() for cand in candidates if cand]
+        self._tokens = [_tokens(cand_l) for cand_l in self._lowered]
+        self._bitmaps = _mapas_caracteres(self._lowered)
+        self._lens = np.array([len(c) for c in self._lowered], dtype=np.float64)[:, None]
+
+    def match(self, df_columns):
+        """Melhor coluna de `df_columns` (lista de nomes ou `ColumnIndex`), ou '' se nenhuma."""
+        if not isinstance(df_columns, ColumnIndex):
+            df_columns = _column_index(tuple(str(c) for c in df_columns))
+        if not df_columns or not self._lowered:
+            return ''
+        cands, min_score = self._lowered, self.min_score
+        # Colunas já vêm normalizadas/tokenizadas no ColumnIndex
+        df_cols, cols_l = df_columns.cols, df_columns.lower
+
+        # Matrizes candidato x coluna de cada critério
+        exato = np.array([[col_l == cand_l for col_l in cols_l] for cand_l in cands])
+        # Substring (col contém candidato ou candidato contém coluna)
+        contido = np.array([[cand_l in col_l or col_l in cand_l for col_l in cols_l] for cand_l in cands])
+        # Token overlap (Jaccard)
+        jaccard = _matriz_jaccard(self._tokens, df_columns.tokens)
+        len_cand = self._lens
+        len_col = np.array([len(c) for c in cols_l], dtype=np.float64)[None, :]
+
+        # Mesma ordem de soma do cálculo escalar, para empates idênticos
+        base = 120.0 * exato
+        base = base + 80.0 * contido
+        base = base + 40.0 * jaccard
+
+        # Similaridade fuzzier (RapidFuzz / SequenceMatcher). Quando uma string contém a
+        # outra (inclui igualdade), as duas medidas valem 2*min/(soma): dispensa o cálculo.
+        # Sem caractere em comum (bitmaps disjuntos) ela é 0.
+        sim = np.where(contido, 2.0 * np.minimum(len_cand, len_col) / (len_cand + len_col), 0.0)
+        conhecido = contido | ((self._bitmaps[:, None] & df_columns.bitmaps[None, :]) == 0)
+        # Nos demais pares a similaridade vale no máximo 1: se nem assim o par alcança o
+        # melhor já conhecido (ou min_score), não há por que calculá-la. Uma igualdade
+        # (>= 240 pontos) descarta todos os pares sem substring (<= 160).
+        parcial = base + 40.0 * sim - 0.01 * len_col
+        piso = max(float(parcial[conhecido].max()) if conhecido.any() else -np.inf, min_score)
+        pendente = ~conhecido & ((base + 40.0) - 0.01 * len_col >= piso)
+        if pendente.any():
+            sim = np.where(pendente, _matriz_similaridade(cands, cols_l, pendente), sim)
+
+        score = base + 40.0 * sim
+        # Slight preference for shorter column names on ties
+        score = score - 0.01 * len_col
+        score = np.where(conhecido | pendente, score, -np.inf)
+
+        # argmax devolve o primeiro máximo na ordem candidato → coluna, como o laço original
+        melhor = int(np.argmax(score))
+        best_score = score.flat[melhor]
+        if best_score > 0 and best_score >= min_score:
+            return df_cols[melhor % len(df_cols)]
+        return ''
 
-            # Similaridade fuzzier via SequenceMatcher
-            try:
-                ratio = difflib.SequenceMatcher(a=cand_l, b=col_l).ratio()
-                score += 40 * ratio
-            except Exception:
-                pass
 
-            # Slight preference for shorter column names on ties
-            score -= 0.01 * len(col_l)
+@functools.lru_cache(maxsize=256)
+def _best_match_column_cached(indice, candidates, min_score):
+    return CandidateMatcher(candidates, min_score).match(indice)
 
-            if score > best_score:
-                best_score = score
-                best_col = col
 
-    if best_score >= min_score:
-        return best_col
-    return ''
+# Dias a somar conforme o weekday() atual: sexta → segunda (+3), sábado → segunda (+2), demais +1
+_DIAS_ATE_PROXIMO_UTIL = (1, 1, 1, 1, 3, 2, 1)
 
 
 def proximo_dia_util(data_obj):
     """Retorna o próximo dia útil (pulando sábados e domingos)."""
     try:
-        next_day = data_obj + timedelta(days=1)
-        while next_day.weekday() >= 5:  # 5 = Saturday, 6 = Sunday
-            next_day += timedelta(days=1)
-        return next_day
+        return data_obj + timedelta(days=_DIAS_ATE_PROXIMO_UTIL[data_obj.weekday()])
     except Exception:
         # Se qualquer erro ocorrer (ex: data_obj não é date), tente converter
         try:
-            next_day = (pd.to_datetime(data_obj) + pd.Timedelta(days=1)).date()
-            while next_day.weekday() >= 5:
-                next_day = (pd.to_datetime(next_day) + pd.Timedelta(days=1)).date()
-            return next_day
+            dia = pd.to_datetime(data_obj).date()
+            return dia + timedelta(days=_DIAS_ATE_PROXIMO_UTIL[dia.weekday()])
         except Exception:
             return data_obj
 
 
+def _primeiro_valido(serie):
+    """Primeiro valor não nulo de `serie` (ou None), sem materializar `dropna()`."""
+    idx = serie.first_valid_index()
+    if idx is None:
+        return None
+    val = serie.loc[idx]
+    if isinstance(val, pd.Series):  # índice com rótulos repetidos
+        val = val.dropna().iloc[0]
+    return val
+
+
 def determine_localidade(user_col_mapping, df_lote, default="CG"):
     """Determina uma string de localidade segura para uso em nomes de arquivos.
 
@@ -395,35 +622,150 @@ def determine_localidade(user_col_mapping, df_lote, default="CG"):
     - Caso contrário, usa 'Cidade' apenas se for muito curta (<=3 chars).
     - Caso contrário, retorna `default`.
     """
+    colunas = set(df_lote.columns)
+
     # Tenta várias chaves comuns para UF
     possible_uf_keys = ["UF", "Estado", "Estado/UF", "UF/Estado"]
     for k in possible_uf_keys:
         uf_col = user_col_mapping.get(k)
-        if uf_col and uf_col in df_lote.columns and not df_lote[uf_col].dropna().empty:
-            val = str(df_lote[uf_col].iloc[0]).strip()
-            if len(val) == 2:
-                return val.upper()
+        if uf_col and uf_col in colunas:
+            val = _primeiro_valido(df_lote[uf_col])
+            if val is not None:
+                val = str(val).strip()
+                if len(val) == 2:
+                    return val.upper()
 
     # Se não houver UF válido, verificar Cidade mas somente se curta (evita nomes longos como 'DOURADOS')
     cidade_col = user_col_mapping.get("Cidade")
-    if cidade_col and cidade_col in df_lote.columns and not df_lote[cidade_col].dropna().empty:
-        val = str(df_lote[cidade_col].iloc[0]).strip()
-        if 0 < len(val) <= 3:
-            return val.upper()
+    if cidade_col and cidade_col in colunas:
+        val = _primeiro_valido(df_lote[cidade_col])
+        if val is not None:
+            val = str(val).strip()
+            if 0 < len(val) <= 3:
+                return val.upper()
 
     return default
 
 
 def gerar_excel_em_memoria(df_lote, consultor, data):
     """Gera um buffer Excel em memória para um DataFrame (usado por divisor de listas)."""
+    return generate_excel_buffer(df_lote)
+
+
+def _linhas_para_excel(df):
+    """Linhas de `df` como tuplas, com NaN/NaT como célula vazia (como no to_excel)."""
+    valores = df.astype(object).where(df.notna(), None)
+    return valores.itertuples(index=False, name=None)
+
+
+def _escrever_linhas_xlsxwriter(df, output, sheet_name):
+    workbook = xlsxwriter.Workbook(output, {
+        **_XLSXWRITER_OPTIONS,
+        'constant_memory': True,
+        'strings_to_numbers': False,
+        'default_date_format': 'yyyy-mm-dd hh:mm:ss',
+    })
+    worksheet = workbook.add_worksheet(str(sheet_name)[:31])
+    # Mesmo estilo de cabeçalho que o pandas aplica
+    header_fmt = workbook.add_format({'bold': True, 'border': 1, 'align': 'center', 'valign': 'top'})
+    worksheet.write_row(0, 0, [str(c) for c in df.columns], header_fmt)
+    for r, row in enumerate(_linhas_para_excel(df), start=1):
+        worksheet.write_row(r, 0, row)
+    workbook.close()
+
+
+def _escrever_linhas_openpyxl(df, output, sheet_name):
+    """Workbook write-only do openpyxl: as linhas vão direto para o XML, sem objeto por célula."""
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Alignment, Border, Font, Side
+
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet(str(sheet_name)[:31])
+    # Mesmo estilo de cabeçalho que o pandas aplica
+    fino = Side(style='thin')
+    cabecalho = []
+    for c in df.columns:
+        cell = WriteOnlyCell(worksheet, value=str(c))
+        cell.font = Font(bold=True)
+        cell.border = Border(left=fino, right=fino, top=fino, bottom=fino)
+        cell.alignment = Alignment(horizontal='center', vertical='top')
+        cabecalho.append(cell)
+    worksheet.append(cabecalho)
+    for row in _linhas_para_excel(df):
+        worksheet.append(row)
+    workbook.save(output)
+
+
+def gerar_excel_em_memoria_fast(df, sheet_name='Sheet1'):
+    """Escreve `df` linha a linha, sem o ExcelFormatter do pandas (objeto por célula).
+
+    Usa xlsxwriter em modo constant_memory ou, sem ele, o modo write-only do openpyxl;
+    a memória fica estável em lotes grandes. Se a escrita direta falhar (tipo de célula
+    não suportado, por exemplo), refaz pelo to_excel do pandas.
+    """
     output = io.BytesIO()
     try:
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df_lote.to_excel(writer, index=False)
-        output.seek(0)
-        return output
+        if _EXCEL_ENGINE == "xlsxwriter":
+            _escrever_linhas_xlsxwriter(df, output, sheet_name)
+        else:
+            _escrever_linhas_openpyxl(df, output, sheet_name)
     except Exception:
-        return io.BytesIO()
+        output = io.BytesIO()
+        try:
+            with _excel_writer(output) as writer:
+                df.to_excel(writer, sheet_name=sheet_name, index=False)
+        except Exception:
+            return io.BytesIO()
+    output.seek(0)
+    return output
+
+
+def _make_match_keys(series):
+    """Gera as chaves de telefone do cruzamento Agendor para uma coluna inteira.
+
+    Retorna (chave_completa, chave_curta), ambas Series com None onde não há chave:
+    - completa: mesmo resultado de `format_phone_for_whatsapp_business(..., include_country_code=False)`
+      (dígitos com pelo menos 10 posições, sem o 55 inicial quando houver 12+ dígitos);
+    - curta: últimos 8 dígitos de `clean_phone_number(..., preserve_full=True)`.
+    """
+    full = clean_phone_series(series, preserve_full=True)
+    short = full.str[-8:]
+
+    # Mesmo fallback do formatador: se a limpeza falhar, tenta os dígitos crus
+    raw = _strip_non_digits_series(pd.Series(series))
+    raw = raw.where(raw.str.len() >= 10).astype(object)
+    digits = full.where(full.notna(), raw)
+
+    com_ddi = digits.str.startswith("55", na=False) & (digits.str.len() >= 12)
+    digits = digits.where(~com_ddi, digits.str[2:])
+    return digits.where(digits.notna(), None), short.where(short.notna(), None)
+
+# Motivos do Agendor que indicam lead já cadastrado (sem diferenciar maiúsculas; aceita "ja"/"cadastrada")
+_DUP_RE = re.compile(r'duplicidade|duplicate|j[áa] existe|cadastrad[oa]', re.IGNORECASE)
+
+# Chaves de cruzamento, em ordem de prioridade para o motivo do erro
+_MATCH_KEY_COLS = ("_KEY_PHONE", "_KEY_EMAIL", "_KEY_PHONE_SHORT")
+
+
+def _codigos_chave(chaves_orig, chaves_err):
+    """Converte as chaves dos dois arquivos para Categorical com categorias compartilhadas.
+
+    Devolve só os códigos inteiros (-1 = sem chave): o cruzamento passa a comparar
+    inteiros em vez de fazer hash de strings Python linha a linha.
+    """
+    categorias = pd.Categorical(pd.concat([chaves_orig, chaves_err], ignore_index=True)).categories
+    codes_orig = pd.Categorical(chaves_orig, categories=categorias).codes
+    codes_err = pd.Categorical(chaves_err, categories=categorias).codes
+    return codes_orig, codes_err
+
+
+def _primeiro_motivo_por_chave(codes, nao_duplicado, motivos):
+    """Motivo do primeiro erro não duplicado de cada chave, indexado pelo código da chave."""
+    com_motivo = (codes >= 0) & nao_duplicado
+    primeiros = pd.Series(motivos.to_numpy()[com_motivo], index=codes[com_motivo])
+    return primeiros[~primeiros.index.duplicated()]
+
 
 def process_agendor_report(df_original, df_error, col_mapping_original=None):
     """
@@ -441,153 +783,108 @@ def process_agendor_report(df_original, df_error, col_mapping_original=None):
     }
     
     # --- 1. Mapeamento de Colunas ---
+    # Colunas de cada arquivo normalizadas uma única vez para as várias buscas abaixo
+    idx_orig = ColumnIndex(df_original.columns)
+    idx_err = ColumnIndex(df_error.columns)
+
     # Colunas de erro/motivo
-    reason_col = best_match_column(list(df_error.columns), ["Motivo", "Erro", "Reason", "Status", "Importação"])
+    reason_col = best_match_column(idx_err, ["Motivo", "Erro", "Reason", "Status", "Importação"])
     
     # Colunas de Chave Primária (Telefone)
-    col_phone_orig = best_match_column(list(df_original.columns), ["WhatsApp", "Whats", "Celular", "Phone", "Telefone"])
-    col_phone_err = best_match_column(list(df_error.columns), ["WhatsApp", "Whats", "Celular", "Phone", "Telefone"])
+    col_phone_orig = best_match_column(idx_orig, ["WhatsApp", "Whats", "Celular", "Phone", "Telefone"])
+    col_phone_err = best_match_column(idx_err, ["WhatsApp", "Whats", "Celular", "Phone", "Telefone"])
     
     # Colunas de Chave Secundária (Email)
-    col_email_orig = best_match_column(list(df_original.columns), ["E-mail", "Email", "Mail"])
-    col_email_err = best_match_column(list(df_error.columns), ["E-mail", "Email", "Mail"])
+    col_email_orig = best_match_column(idx_orig, ["E-mail", "Email", "Mail"])
+    col_email_err = best_match_column(idx_err, ["E-mail", "Email", "Mail"])
 
     # Se não temos nem telefone nem email compativeis, abortar
     if (not col_phone_orig or not col_phone_err) and (not col_email_orig or not col_email_err):
         return df_original, pd.DataFrame(), stats 
 
     # --- 2. Preparação de Dados ---
-    df_temp_orig = df_original.copy()
-    df_temp_err = df_error.copy()
+    # As chaves ficam em Series locais: os DataFrames de entrada não são copiados nem alterados.
     
     # Helpers de Normalização
-    def norm_phone(val):
-        try:
-            val, _ = format_phone_for_whatsapp_business(val, include_country_code=False)
-            return val if val else None
-        except: return None
-    
-    def get_short_phone(val):
-        # Retorna apenas os últimos 8 dígitos para matching agressivo
-        # Usa clean_phone_number para garantir tratamento de notação científica
-        s = clean_phone_number(val, preserve_full=True)
-        if pd.isna(s): return None
-        s = str(s)
-        return s[-8:] if len(s) >= 8 else None
-        
     def norm_email(val):
         try:
             s_val = str(val).strip().lower()
             return s_val if "@" in s_val else None
         except: return None
 
-    # Gerar Chaves
-    # Chave 1: Telefone Completo (Normalizado)
-    df_temp_orig["_KEY_PHONE"] = df_temp_orig[col_phone_orig].apply(norm_phone) if col_phone_orig else None
-    df_temp_err["_KEY_PHONE"] = df_temp_err[col_phone_err].apply(norm_phone) if col_phone_err else None
-    
-    # Chave 2: Email
-    df_temp_orig["_KEY_EMAIL"] = df_temp_orig[col_email_orig].apply(norm_email) if col_email_orig else None
-    df_temp_err["_KEY_EMAIL"] = df_temp_err[col_email_err].apply(norm_email) if col_email_err else None
-    
-    # Chave 3: Telefone Curto (Últimos 8 inteiros) - Para pegar casos onde Agendor zoou o DDD
-    df_temp_orig["_KEY_PHONE_SHORT"] = df_temp_orig[col_phone_orig].apply(get_short_phone) if col_phone_orig else None
-    df_temp_err["_KEY_PHONE_SHORT"] = df_temp_err[col_phone_err].apply(get_short_phone) if col_phone_err else None
+    def gerar_chaves(df, col_phone, col_email):
+        vazio = pd.Series(None, index=df.index, dtype=object)
+        # Chave 1: Telefone Completo (Normalizado)
+        # Chave 3: Telefone Curto (Últimos 8 inteiros) - Para pegar casos onde Agendor zoou o DDD
+        # (as chaves 1 e 3 saem juntas da mesma passada vetorizada)
+        phone, short = _make_match_keys(df[col_phone]) if col_phone else (vazio, vazio)
+        # Chave 2: Email
+        email = df[col_email].apply(norm_email) if col_email else vazio
+        return {"_KEY_PHONE": phone, "_KEY_EMAIL": email, "_KEY_PHONE_SHORT": short}
+
+    keys_orig = gerar_chaves(df_original, col_phone_orig, col_email_orig)
+    keys_err = gerar_chaves(df_error, col_phone_err, col_email_err)
 
     # --- 3. Identificação de Erros ---
     # Identificar quais linhas do arquivo de ERRO são Duplicatas vs Outros
-    is_duplicate_mask = pd.Series(False, index=df_temp_err.index)
+    is_duplicate_mask = pd.Series(False, index=df_error.index)
     if reason_col:
-        col_series = df_temp_err[reason_col].astype(str).str.lower()
-        is_duplicate_mask = col_series.str.contains("duplicidade|duplicate|já existe|cadastrado", na=False, regex=True)
+        is_duplicate_mask = df_error[reason_col].astype("string").str.contains(_DUP_RE, na=False)
         is_duplicate_mask = is_duplicate_mask.fillna(False).astype(bool)
+    nao_duplicado = ~is_duplicate_mask.to_numpy()
 
-    # Separa os DataFrames de erro
-    df_err_dupes = df_temp_err[is_duplicate_mask]
-    df_err_others = df_temp_err[~is_duplicate_mask]
-    
-    stats["duplicates_removed"] = len(df_err_dupes)
+    stats["duplicates_removed"] = int((~nao_duplicado).sum())
     
     # Forensic Stats for Debugging
     stats["debug_reason_col"] = reason_col
-    stats["rows_classified_dupe"] = len(df_err_dupes)
-    stats["rows_classified_other"] = len(df_err_others)
+    stats["rows_classified_dupe"] = stats["duplicates_removed"]
+    stats["rows_classified_other"] = int(nao_duplicado.sum())
     
     # Count how many "Other" rows have at least one key
-    valid_key_count = df_err_others.apply(lambda r: 1 if (pd.notna(r.get("_KEY_PHONE")) or pd.notna(r.get("_KEY_EMAIL")) or pd.notna(r.get("_KEY_PHONE_SHORT"))) else 0, axis=1).sum()
-    stats["others_with_valid_key"] = valid_key_count
+    tem_chave = np.zeros(len(df_error), dtype=bool)
+    for chaves in keys_err.values():
+        tem_chave |= chaves.notna().to_numpy()
+    stats["others_with_valid_key"] = int((tem_chave & nao_duplicado).sum())
 
     # --- 4. Cruzamento (Matching) ---
     # Queremos encontrar quais linhas do ORIGINAL correspondem aos erros.
     # Estratégia: Match Phone OR Match Email OR Match Short Phone
-    
-    # Conjuntos de chaves de erro (para exclusão rápida)
-    err_phones = set(df_temp_err["_KEY_PHONE"].dropna().unique())
-    err_emails = set(df_temp_err["_KEY_EMAIL"].dropna().unique())
-    err_phones_short = set(df_temp_err["_KEY_PHONE_SHORT"].dropna().unique())
-    
-    # Conjuntos específicos de "Outros Erros" (para ajuste manual)
-    fix_phones = set(df_err_others["_KEY_PHONE"].dropna().unique())
-    fix_emails = set(df_err_others["_KEY_EMAIL"].dropna().unique())
-    fix_phones_short = set(df_err_others["_KEY_PHONE_SHORT"].dropna().unique())
-
-    # (A) Identificar SAFE vs ERROR no Original
-    # Uma linha é ERROR se seu telefone OU email estiver no conjunto de erros totais
-    # Otimização vetorizada
-    mask_is_error = pd.Series(False, index=df_temp_orig.index)
-    
-    if err_phones:
-        mask_is_error |= df_temp_orig["_KEY_PHONE"].isin(err_phones)
-    if err_emails:
-        mask_is_error |= df_temp_orig["_KEY_EMAIL"].isin(err_emails)
-    if err_phones_short:
-        # Só ativa Short Match se não tiver match full? Não, use OR.
-        mask_is_error |= df_temp_orig["_KEY_PHONE_SHORT"].isin(err_phones_short)
-    
-    df_safe = df_temp_orig[~mask_is_error].copy()
-    
-    # (B) Identificar MANUAL FIX (Apenas os que não são duplicatas)
-    mask_is_fix = pd.Series(False, index=df_temp_orig.index)
-    if fix_phones:
-        mask_is_fix |= df_temp_orig["_KEY_PHONE"].isin(fix_phones)
-    if fix_emails:
-        mask_is_fix |= df_temp_orig["_KEY_EMAIL"].isin(fix_emails)
-    if fix_phones_short:
-        mask_is_fix |= df_temp_orig["_KEY_PHONE_SHORT"].isin(fix_phones_short)
-        
-    df_manual_fix = df_temp_orig[mask_is_fix].copy()
+    # As chaves viram códigos inteiros compartilhados; pertinência é um np.isin sobre inteiros.
+    mask_is_error = np.zeros(len(df_original), dtype=bool)
+    mask_is_fix = np.zeros(len(df_original), dtype=bool)
+    motivos = []
+    for key in _MATCH_KEY_COLS:
+        codes_orig, codes_err = _codigos_chave(keys_orig[key], keys_err[key])
+        validas = codes_err >= 0
+        # (A) ERROR: a chave aparece em qualquer linha do relatório de erros
+        mask_is_error |= np.isin(codes_orig, np.unique(codes_err[validas]))
+        # (B) MANUAL FIX: a chave aparece em algum erro que não é duplicata
+        em_fix = np.isin(codes_orig, np.unique(codes_err[validas & nao_duplicado]))
+        mask_is_fix |= em_fix
+        if reason_col:
+            # Motivo "válido" = chave encontrada entre os erros não duplicados e texto não vazio
+            motivo = _primeiro_motivo_por_chave(codes_err, nao_duplicado, df_error[reason_col]).reindex(codes_orig)
+            motivo = motivo.reset_index(drop=True)
+            motivos.append((motivo, em_fix & motivo.ne("").to_numpy()))
+
+    # Indexação booleana já devolve frames novos; não é preciso .copy()
+    df_safe = df_original[~mask_is_error]
+    df_manual_fix = df_original[mask_is_fix]
     
     # --- 5. Enriquecimento (Motivo) ---
     if reason_col and not df_manual_fix.empty:
-        # Criar mapas de motivo
-        # Prioridade para telefone
-        map_phone = df_err_others.dropna(subset=["_KEY_PHONE"]).drop_duplicates("_KEY_PHONE").set_index("_KEY_PHONE")[reason_col]
-        map_email = df_err_others.dropna(subset=["_KEY_EMAIL"]).drop_duplicates("_KEY_EMAIL").set_index("_KEY_EMAIL")[reason_col]
-        map_short = df_err_others.dropna(subset=["_KEY_PHONE_SHORT"]).drop_duplicates("_KEY_PHONE_SHORT").set_index("_KEY_PHONE_SHORT")[reason_col]
-        
-        def get_reason(row):
-            p = row.get("_KEY_PHONE")
-            e = row.get("_KEY_EMAIL")
-            s = row.get("_KEY_PHONE_SHORT")
-            res = None
-            if p: res = map_phone.get(p)
-            if not res and e: res = map_email.get(e)
-            if not res and s: res = map_short.get(s)
-            return res
-            
-        df_manual_fix["MOTIVO_ERRO"] = df_manual_fix.apply(get_reason, axis=1)
+        # Prioridade para telefone; e-mail e telefone curto só preenchem motivos ainda vazios
+        motivo, valido = motivos[0]
+        for alternativo, alternativo_valido in motivos[1:]:
+            motivo = motivo.where(valido, alternativo)
+            valido = valido | alternativo_valido
+        df_manual_fix = df_manual_fix.assign(MOTIVO_ERRO=motivo[mask_is_fix].to_numpy())
         
         # Reordenar colunas
-        cols = ["MOTIVO_ERRO"] + [c for c in df_manual_fix.columns if c != "MOTIVO_ERRO" and not c.startswith("_KEY_")]
+        cols = ["MOTIVO_ERRO"] + [c for c in df_manual_fix.columns if c != "MOTIVO_ERRO"]
         df_manual_fix = df_manual_fix[cols]
 
     stats["manual_fix_needed"] = len(df_manual_fix)
     stats["safe_total"] = len(df_safe)
-    
-    # Limpeza de colunas auxiliares
-    for df in [df_safe, df_manual_fix]:
-        drop_cols = [c for c in df.columns if c.startswith("_KEY_")]
-        if drop_cols:
-            df.drop(columns=drop_cols, inplace=True)
             
     return df_safe, df_manual_fix, stats